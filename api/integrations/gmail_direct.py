@@ -1,13 +1,15 @@
 # api/integrations/gmail_direct.py
 import os
 import base64
+import threading
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, Any
 
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from email.message import EmailMessage
+from email.policy import SMTP
 
 # Accept both env vars (preferred) and sensible defaults used in your stack
 TOKEN_PATH = Path(os.getenv("GOOGLE_TOKEN_PATH", "/app/state/google_token.json"))
@@ -17,30 +19,53 @@ SCOPES = [
     "https://www.googleapis.com/auth/gmail.modify",
 ]
 
+# googleapiclient retries 429/5xx itself (exponential backoff) when asked to.
+# Only used on reads/updates: a retried create after a lost 5xx response could duplicate.
+_NUM_RETRIES = 3
+
+# Parsed credentials are reused until the token file changes on disk (keyed by mtime).
+# Service objects are kept per thread: httplib2.Http underneath is not thread-safe.
+_CREDS_CACHE: Dict[str, Any] = {"mtime_ns": None, "creds": None}
+_CREDS_LOCK = threading.Lock()
+_SVC_LOCAL = threading.local()
+
 def _get_creds() -> Credentials:
     if not TOKEN_PATH.exists():
         raise RuntimeError(f"Gmail token not found: {TOKEN_PATH}")
-    creds = Credentials.from_authorized_user_file(str(TOKEN_PATH), SCOPES)
-    if not creds.valid and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-        # persist the refresh
-        TOKEN_PATH.write_text(creds.to_json(), encoding="utf-8")
-    return creds
-
-def _header(headers, name: str) -> str:
-    low = name.lower()
+    with _CREDS_LOCK:
+        mtime_ns = TOKEN_PATH.stat().st_mtime_ns
+        creds = _CREDS_CACHE["creds"] if _CREDS_CACHE["mtime_ns"] == mtime_ns else None
+        if creds is None:
+            creds = Credentials.from_authorized_user_file(str(TOKEN_PATH), SCOPES)
+            _CREDS_CACHE.update(mtime_ns=mtime_ns, creds=creds)
+        if not creds.valid and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+            # persist the refresh; re-key the cache so our own write doesn't invalidate it
+            TOKEN_PATH.write_text(creds.to_json(), encoding="utf-8")
+            _CREDS_CACHE["mtime_ns"] = TOKEN_PATH.stat().st_mtime_ns
+        return creds
+
+def _gmail_service():
+    """Gmail service for the current thread, rebuilt only when the credentials change."""
+    creds = _get_creds()
+    if getattr(_SVC_LOCAL, "creds", None) is not creds:
+        _SVC_LOCAL.gmail = build("gmail", "v1", credentials=creds, cache_discovery=False, static_discovery=True)
+        _SVC_LOCAL.creds = creds
+    return _SVC_LOCAL.gmail
+
+def _header_map(headers) -> Dict[str, str]:
+    """Lower-cased header name -> value, built once per message (first occurrence wins)."""
+    hmap: Dict[str, str] = {}
     for h in headers or []:
-        if (h.get("name") or "").lower() == low:
-            return h.get("value") or ""
-    return ""
+        hmap.setdefault((h.get("name") or "").lower(), h.get("value") or "")
+    return hmap
 
 def get_newest_message_info(query: Optional[str] = None) -> Dict[str, str]:
     """Return newest message with IDs + headers needed for threaded reply."""
-    creds = _get_creds()
-    svc = build("gmail", "v1", credentials=creds)
+    svc = _gmail_service()
 
     q = query or 'in:inbox newer_than:14d -category:promotions'
-    li = svc.users().messages().list(userId="me", q=q, maxResults=1).execute()
+    li = svc.users().messages().list(userId="me", q=q, maxResults=1, fields="messages/id").execute(num_retries=_NUM_RETRIES)
     msgs = li.get("messages", [])
     if not msgs:
         raise RuntimeError("No recent Gmail messages found with the query.")
@@ -49,22 +74,61 @@ def get_newest_message_info(query: Optional[str] = None) -> Dict[str, str]:
         userId="me",
         id=msgs[0]["id"],
         format="metadata",
-        metadataHeaders=["From","Subject","Message-Id","References","In-Reply-To","To","Date"]
-    ).execute()
+        metadataHeaders=["From","Subject","Message-Id","References","In-Reply-To","To","Date"],
+        fields="id,threadId,payload/headers",
+    ).execute(num_retries=_NUM_RETRIES)
 
-    headers = msg.get("payload", {}).get("headers", [])
+    hmap = _header_map(msg.get("payload", {}).get("headers", []))
     return {
         "gmail_id": msg.get("id",""),
         "thread_id": msg.get("threadId",""),
-        "from": _header(headers, "From"),
-        "to": _header(headers, "To"),
-        "subject": _header(headers, "Subject"),
-        "hdr_msgid": _header(headers, "Message-Id"),
-        "refs": _header(headers, "References") or _header(headers, "In-Reply-To"),
-        "date": _header(headers, "Date"),   # <-- add this
+        "from": hmap.get("from", ""),
+        "to": hmap.get("to", ""),
+        "subject": hmap.get("subject", ""),
+        "hdr_msgid": hmap.get("message-id", ""),
+        "refs": hmap.get("references") or hmap.get("in-reply-to", ""),
+        "date": hmap.get("date", ""),   # <-- add this
 
     }
 
+# EmailMessage's default policy with RFC 5322 CRLF line endings (module-level, built once)
+_DRAFT_POLICY = SMTP
+# EmailMessage folds header lines and picks a transfer encoding past this many bytes per line
+_MAX_LINE = 78
+
+def _plain_header_ok(name: str, value: str) -> bool:
+    # printable ASCII that fits on one line -> no RFC 2047 encoding or folding needed
+    return value.isascii() and value.isprintable() and len(name) + 2 + len(value) <= _MAX_LINE
+
+def _build_reply_bytes(hdrs, body_text: str) -> bytes:
+    """
+    RFC 822 bytes (CRLF line endings) for a single text/plain part.
+    Headers that fit on one printable ASCII line and bodies whose lines are all <= 78 bytes
+    are formatted directly, with the same 7bit/8bit choice set_content makes; header
+    values are sent as given rather than re-rendered by the header registry.
+    Anything else (encoded words, folding, quoted-printable/base64) goes through EmailMessage.
+    """
+    body = body_text if body_text.endswith("\n") else body_text + "\n"
+    raw_body = body.encode("utf-8")
+    if (
+        all(_plain_header_ok(k, v) for k, v in hdrs)
+        and b"\r" not in raw_body
+        and all(len(l) <= _MAX_LINE for l in raw_body.split(b"\n"))
+    ):
+        head = "".join(f"{k}: {v}\r\n" for k, v in hdrs)
+        head += (
+            'Content-Type: text/plain; charset="utf-8"\r\n'
+            f"Content-Transfer-Encoding: {'7bit' if raw_body.isascii() else '8bit'}\r\n"
+            "MIME-Version: 1.0\r\n\r\n"
+        )
+        return head.encode("ascii") + raw_body.replace(b"\n", b"\r\n")
+
+    em = EmailMessage()
+    for k, v in hdrs:
+        em[k] = v
+    em.set_content(body_text)
+    return em.as_bytes(policy=_DRAFT_POLICY)
+
 def create_reply_draft(
     body_text: str,
     thread_id: str,
@@ -74,27 +138,25 @@ def create_reply_draft(
     to: Optional[str],
 ) -> str:
     """Create a draft reply in the given thread. Returns draft ID."""
-    creds = _get_creds()
-    svc = build("gmail", "v1", credentials=creds)
+    svc = _gmail_service()
 
-    em = EmailMessage()
+    hdrs = []
     # Use 'To' for safety; Gmail GUI infers, API drafts appreciate explicit headers
     if to:
-        em["To"] = to
+        hdrs.append(("To", to))
     # Subject prefixed if needed
     if subject:
-        em["Subject"] = subject if subject.lower().startswith("re:") else f"Re: {subject}"
+        hdrs.append(("Subject", subject if subject.lower().startswith("re:") else f"Re: {subject}"))
     if hdr_msgid:
-        em["In-Reply-To"] = hdr_msgid
+        hdrs.append(("In-Reply-To", hdr_msgid))
     if refs:
-        em["References"] = refs
+        hdrs.append(("References", refs))
 
-    em.set_content(body_text)
-
-    raw = base64.urlsafe_b64encode(em.as_bytes()).decode("utf-8")
+    raw = base64.urlsafe_b64encode(_build_reply_bytes(hdrs, body_text)).decode("ascii")
     draft = svc.users().drafts().create(
         userId="me",
-        body={"message": {"raw": raw, "threadId": thread_id}}
+        body={"message": {"raw": raw, "threadId": thread_id}},
+        fields="id",
     ).execute()
 
     return draft.get("id", "")
@@ -117,61 +179,64 @@ def reply_to_newest(body_text: str, query: Optional[str] = None) -> str:
 # --- Add below existing code in api/integrations/gmail_direct.py ---
 
 import re
+import email
 from html import unescape
 
-def _decode_part_data(data_b64: str) -> str:
-    if not data_b64:
+def _part_text(part) -> str:
+    """Transfer-decoded payload of a leaf MIME part as str (charset-aware, lossy on junk)."""
+    data = part.get_payload(decode=True)
+    if not data:
         return ""
     try:
-        import base64
-        return base64.urlsafe_b64decode(data_b64.encode("utf-8")).decode("utf-8", errors="ignore")
-    except Exception:
-        return ""
+        return data.decode(part.get_content_charset() or "utf-8", errors="ignore")
+    except LookupError:  # unknown charset label
+        return data.decode("utf-8", errors="ignore")
+
+_RE_SCRIPT_STYLE = re.compile(r"(?is)<(script|style).*?>.*?</\1>")
+_RE_BR = re.compile(r"(?i)<br\s*/?>")
+_RE_P_CLOSE = re.compile(r"(?i)</p\s*>")
+# [^>]* instead of .*? -> no backtracking blow-up on unterminated tags
+_RE_TAG = re.compile(r"<[^>]*>")
 
 def _html_to_text(html: str) -> str:
     # very light HTML->text: strip tags, unescape entities
-    txt = re.sub(r"(?is)<(script|style).*?>.*?</\1>", "", html or "")
-    txt = re.sub(r"(?is)<br\s*/?>", "\n", txt)
-    txt = re.sub(r"(?is)</p\s*>", "\n\n", txt)
-    txt = re.sub(r"(?is)<.*?>", "", txt)
+    txt = _RE_SCRIPT_STYLE.sub("", html or "")
+    txt = _RE_BR.sub("\n", txt)
+    txt = _RE_P_CLOSE.sub("\n\n", txt)
+    txt = _RE_TAG.sub("", txt)
     return unescape(txt)
 
 def get_message_body_text(message_id: str) -> str:
     """Return best-effort plain text body for a Gmail message."""
-    creds = _get_creds()
-    svc = build("gmail", "v1", credentials=creds)
+    svc = _gmail_service()
 
+    # format=raw: one base64 blob, parsed locally by the stdlib instead of a JSON MIME tree
     msg = svc.users().messages().get(
         userId="me",
         id=message_id,
-        format="full"
-    ).execute()
+        format="raw",
+        fields="raw,snippet",
+    ).execute(num_retries=_NUM_RETRIES)
 
-    payload = msg.get("payload", {}) or {}
-    # strategy: collect text/plain; if none, fall back to text/html (stripped)
-    def gather_parts(p):
-        if not isinstance(p, dict):
-            return []
-        parts = p.get("parts")
-        if parts:
-            out = []
-            for sp in parts:
-                out.extend(gather_parts(sp))
-            return out
-        else:
-            mime = p.get("mimeType", "")
-            data = _decode_part_data((p.get("body") or {}).get("data", ""))
-            return [(mime, data)] if data else []
-
-    parts = gather_parts(payload)
-    # prefer text/plain
-    for mime, data in parts:
-        if mime.startswith("text/plain") and data.strip():
-            return data
-    # else try text/html
-    for mime, data in parts:
-        if mime.startswith("text/html") and data.strip():
-            return _html_to_text(data)
+    raw = msg.get("raw")
+    if raw:
+        em = email.message_from_bytes(base64.urlsafe_b64decode(raw))
+        # strategy: first non-empty text/plain wins; html parts are only decoded if no plain exists
+        html_parts = []
+        for part in em.walk():
+            if part.is_multipart():
+                continue
+            ctype = part.get_content_type()
+            if ctype == "text/plain":
+                data = _part_text(part)
+                if data.strip():
+                    return data
+            elif ctype == "text/html":
+                html_parts.append(part)
+        for part in html_parts:
+            data = _part_text(part)
+            if data.strip():
+                return _html_to_text(data)
 
     # fallback: snippet
     snip = msg.get("snippet", "")
@@ -188,7 +253,7 @@ def reply_to_newest_with_meta(body_text: str, query: str | None = None,
     # Extend info with date (we already return in get_newest_message_info if you added it)
     # If your get_newest_message_info doesn't return date yet, extend it:
     #   add metadataHeaders=["From","Subject","Message-Id","References","In-Reply-To","To","Date"]
-    #   and include "date": _header(headers, "Date"),
+    #   and include "date": hmap.get("date", ""),
     if "date" not in info:
         info["date"] = ""
 
@@ -3,8 +3,9 @@
 from __future__ import annotations
 import os
 import json
+import threading
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Dict
 
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
@@ -26,10 +27,25 @@ SCOPES_GDOCS = [
 ]
 
 
+# googleapiclient retries 429/5xx itself (exponential backoff) when asked to.
+# Only used on reads/updates: a retried create after a lost 5xx response could duplicate.
+_NUM_RETRIES = 3
+
+# Gmail recommends keeping batches at <= 50 calls to avoid per-user rate limiting
+_GMAIL_BATCH_MAX = 50
+
+
 class GoogleAuthError(RuntimeError):
     pass
 
 
+# Parsed creds per scope set, reused until google_token.json changes on disk (mtime).
+# Services are cached per thread because httplib2.Http is not thread-safe.
+_CREDS_CACHE: Dict[Tuple[str, ...], Tuple[int, Credentials]] = {}
+_CREDS_LOCK = threading.Lock()
+_SVC_LOCAL = threading.local()
+
+
 def _load_google_creds(required_scopes: list[str]) -> Credentials:
     """
     Loads token from /app/secrets/google_token.json and silently refreshes if needed.
@@ -41,6 +57,19 @@ def _load_google_creds(required_scopes: list[str]) -> Credentials:
             "  python .\\scripts\\g_auth_host.py"
         )
 
+    key = tuple(required_scopes)
+    with _CREDS_LOCK:
+        mtime_ns = TOKEN_PATH.stat().st_mtime_ns
+        hit = _CREDS_CACHE.get(key)
+        if hit and hit[0] == mtime_ns and hit[1].valid:
+            return hit[1]
+        creds = _load_google_creds_uncached(required_scopes)
+        # re-stat: a refresh above may have rewritten the file
+        _CREDS_CACHE[key] = (TOKEN_PATH.stat().st_mtime_ns, creds)
+        return creds
+
+
+def _load_google_creds_uncached(required_scopes: list[str]) -> Credentials:
     try:
         creds = Credentials.from_authorized_user_file(str(TOKEN_PATH), required_scopes)
     except Exception as e:
@@ -72,35 +101,76 @@ def _load_google_creds(required_scopes: list[str]) -> Credentials:
     return creds
 
 
+def _service(api: str, version: str, scopes: list[str]):
+    """Per-thread cached discovery client; rebuilt only when the creds object changes."""
+    creds = _load_google_creds(scopes)
+    cache = getattr(_SVC_LOCAL, "svcs", None)
+    if cache is None:
+        cache = _SVC_LOCAL.svcs = {}
+    hit = cache.get((api, version))
+    if hit is None or hit[0] is not creds:
+        hit = cache[(api, version)] = (creds, build(api, version, credentials=creds, cache_discovery=False, static_discovery=True))
+    return hit[1]
+
+
 # ---------------- Gmail helpers already used elsewhere ----------------
 def gmail_fetch_newest_thread(n: int = 3) -> str:
-    creds = _load_google_creds(SCOPES_GMAIL)
-    svc = build("gmail", "v1", credentials=creds, cache_discovery=False)
+    svc = _service("gmail", "v1", SCOPES_GMAIL)
     # Minimal sample: list N recent messages and pull headers/snippets
-    resp = svc.users().messages().list(userId="me", maxResults=n).execute()
+    resp = svc.users().messages().list(userId="me", maxResults=n, fields="messages/id").execute(num_retries=_NUM_RETRIES)
     ids = [m["id"] for m in resp.get("messages", [])]
+
+    # One multipart /batch request per 50 ids instead of one HTTPS round-trip per message
+    got: Dict[str, dict] = {}
+    errs: list = []
+
+    def _cb(request_id, response, exception):
+        if exception is None:
+            got[request_id] = response
+        else:
+            errs.append(exception)
+
+    for off in range(0, len(ids), _GMAIL_BATCH_MAX):
+        batch = svc.new_batch_http_request(callback=_cb)
+        for mid in ids[off:off + _GMAIL_BATCH_MAX]:
+            batch.add(
+                svc.users().messages().get(
+                    userId="me", id=mid, format="metadata", metadataHeaders=["From","Subject","Date"],
+                    fields="id,snippet,payload/headers",
+                ),
+                request_id=mid,
+            )
+        batch.execute()
+    if errs:
+        # expired token / 403 / quota: surface it instead of reporting an empty inbox
+        raise errs[0]
+
     parts = []
-    for i, mid in enumerate(ids, 1):
-        m = svc.users().messages().get(userId="me", id=mid, format="metadata", metadataHeaders=["From","Subject","Date"]).execute()
-        hdrs = {h["name"]: h["value"] for h in m.get("payload",{}).get("headers", [])}
+    for mid in ids:
+        m = got.get(mid)
+        if m is None:
+            continue
+        # lower-cased keys: Gmail echoes header names as sent ("FROM", "subject", ...)
+        hdrs = {}
+        for h in m.get("payload",{}).get("headers", []):
+            hdrs.setdefault(h["name"].lower(), h["value"])
         snippet = m.get("snippet","").replace("\n"," ").strip()
-        parts.append(f"[{i}] From: {hdrs.get('From','?')} | Date: {hdrs.get('Date','?')}\n"
-                     f"    Subject: {hdrs.get('Subject','(no subject)')}\n"
+        parts.append(f"[{len(parts) + 1}] From: {hdrs.get('from','?')} | Date: {hdrs.get('date','?')}\n"
+                     f"    Subject: {hdrs.get('subject','(no subject)')}\n"
                      f"    Preview: {snippet[:200]}")
     return "\n".join(parts) if parts else "(no messages)"
 
 
 def gmail_create_draft_reply(thread_id: str, text: str) -> str:
     # Simple placeholder – in your earlier flows you used a different helper.
-    creds = _load_google_creds(SCOPES_GMAIL)
-    svc = build("gmail", "v1", credentials=creds, cache_discovery=False)
+    svc = _service("gmail", "v1", SCOPES_GMAIL)
     body = {
         "message": {
             "threadId": thread_id,
             "raw": "",  # You could construct RFC822 if needed
         }
     }
-    draft = svc.users().drafts().create(userId="me", body=body).execute()
+    draft = svc.users().drafts().create(userId="me", body=body, fields="id").execute()
     return f"https://mail.google.com/mail/u/0/#drafts?compose={draft.get('id')}"
 
 
@@ -111,12 +181,10 @@ def gdocs_create_from_text(title: str, text: str) -> str:
     Returns a human-friendly URL to the new doc.
     Requires Docs + Drive.file scopes.
     """
-    creds = _load_google_creds(SCOPES_GDOCS)
-
     # 1) Create an empty doc with the title
-    docs = build("docs", "v1", credentials=creds, cache_discovery=False)
+    docs = _service("docs", "v1", SCOPES_GDOCS)
     try:
-        doc = docs.documents().create(body={"title": title}).execute()
+        doc = docs.documents().create(body={"title": title}, fields="documentId").execute()
         doc_id = doc["documentId"]
     except HttpError as e:
         raise GoogleAuthError(f"Google Docs create failed: {e}")
@@ -130,7 +198,8 @@ def gdocs_create_from_text(title: str, text: str) -> str:
                     {"insertText": {"location": {"index": 1}, "text": text}}
                 ]
             },
-        ).execute()
+            fields="documentId",
+        ).execute(num_retries=_NUM_RETRIES)
     except HttpError as e:
         raise GoogleAuthError(f"Google Docs update failed: {e}")
 
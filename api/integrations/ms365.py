@@ -6,14 +6,30 @@ from __future__ import annotations
 
 import os
 import json
+import time
+import random
+import atexit
+import functools
+import threading
 import datetime as dt
-from typing import List, Optional
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlencode, quote
 
 import httpx
 import msal
 
+try:
+    import orjson  # optional: faster JSON for Graph payloads
+except Exception:
+    orjson = None
+
 import io
+from xml.sax.saxutils import escape as _xml_escape
 from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
 from docx.shared import Pt
 
 
@@ -35,6 +51,84 @@ RESOURCE_SCOPES = [
 ]
 
 
+# ------------------------------------------------------------------------------
+# Shared HTTP client (keep-alive pool; HTTP/2 when the h2 extra is installed)
+# ------------------------------------------------------------------------------
+
+_HTTP: Optional[httpx.Client] = None
+_HTTP_LOCK = threading.Lock()
+
+
+def _http() -> httpx.Client:
+    """Lazily create one pooled client so Graph calls skip the TCP+TLS handshake."""
+    global _HTTP
+    if _HTTP is None:
+        with _HTTP_LOCK:
+            if _HTTP is None:
+                _HTTP = httpx.Client(
+                    http2=importlib.util.find_spec("h2") is not None,
+                    timeout=30,
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+                )
+    return _HTTP
+
+
+@atexit.register
+def _close_http() -> None:
+    if _HTTP is not None:
+        _HTTP.close()
+
+
+# Transient Graph statuses. POST is only retried when the request surely wasn't applied.
+_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+_RETRY_STATUS_POST = frozenset({429, 503})
+
+
+def _retry_delay(attempt: int, base: float, r: Optional[httpx.Response] = None) -> float:
+    ra = r.headers.get("Retry-After") if r is not None else None
+    if ra and ra.isdigit():
+        return min(30.0, float(ra))
+    return base * (2 ** attempt) + random.random() * base
+
+
+def _retry_http(max_attempts: int = 4, base: float = 0.25):
+    """Retry an httpx call on 429/5xx (honoring Retry-After) and on connect errors, with jittered backoff."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(method: str, url: str, **kw) -> httpx.Response:
+            retry_on = _RETRY_STATUS_POST if method.upper() == "POST" else _RETRY_STATUS
+            for attempt in range(max_attempts):
+                last = attempt == max_attempts - 1
+                try:
+                    r = fn(method, url, **kw)
+                except httpx.ConnectError:
+                    if last:
+                        raise
+                    time.sleep(_retry_delay(attempt, base))
+                    continue
+                if r.status_code not in retry_on or last:
+                    return r
+                time.sleep(_retry_delay(attempt, base, r))
+        return wrapper
+    return deco
+
+
+@_retry_http()
+def _graph(method: str, url: str, **kw) -> httpx.Response:
+    """Single entry point for Graph HTTP calls (pooled client + retry)."""
+    return _http().request(method, url, **kw)
+
+
+def _rjson(r: httpx.Response):
+    """Decode a JSON response body (orjson when available)."""
+    return orjson.loads(r.content) if orjson else r.json()
+
+
+def _jbody(payload) -> bytes:
+    """Encode a JSON request body; send with content= and an explicit JSON Content-Type."""
+    return orjson.dumps(payload) if orjson else json.dumps(payload).encode("utf-8")
+
+
 # ------------------------------------------------------------------------------
 # Token cache path (robust)
 # ------------------------------------------------------------------------------
@@ -53,8 +147,9 @@ def _candidate_token_paths() -> List[str]:
     ]
 
 
+@functools.lru_cache(maxsize=1)
 def _resolve_token_cache_path() -> str:
-    """Pick the first existing token cache path or raise with detailed info."""
+    """Pick the first existing token cache path or raise with detailed info (memoized)."""
     tried = []
     for p in _candidate_token_paths():
         tried.append(p)
@@ -67,29 +162,59 @@ def _resolve_token_cache_path() -> str:
     )
 
 
+# Access token + MSAL app kept in memory; the cache file is re-read only when its mtime changes
+_TOKEN_CACHE: dict = {"access_token": None, "expires_at": 0.0, "app": None, "path": None, "mtime_ns": None}
+_TOKEN_LOCK = threading.Lock()
+
+
 def _load_token() -> str:
     """
     Load a valid Graph access token from the MSAL device-code cache.
     Uses ONLY resource scopes for silent refresh.
     """
     cache_path = _resolve_token_cache_path()
-
-    cache = msal.SerializableTokenCache()
     try:
-        with open(cache_path, "r", encoding="utf-8") as f:
-            cache.deserialize(f.read())
-    except Exception as e:
-        raise RuntimeError(f"Token cache unreadable at {cache_path}: {e}")
-
-    app = msal.PublicClientApplication(CLIENT_ID, authority=AUTHORITY, token_cache=cache)
-    accounts = app.get_accounts()
-    if not accounts:
-        raise RuntimeError("No Microsoft account found in cache. Re-run ms_auth.py.")
-
-    result = app.acquire_token_silent(RESOURCE_SCOPES, account=accounts[0])
-    if not result or "access_token" not in result:
-        raise RuntimeError("Cannot refresh token silently. Re-run ms_auth.py.")
-    return result["access_token"]
+        mtime_ns = os.stat(cache_path).st_mtime_ns
+    except OSError:
+        # memoized path vanished (remount / re-auth elsewhere): walk the candidates again
+        _resolve_token_cache_path.cache_clear()
+        cache_path = _resolve_token_cache_path()
+        try:
+            mtime_ns = os.stat(cache_path).st_mtime_ns
+        except OSError as e:
+            raise RuntimeError(f"Token cache unreadable at {cache_path}: {e}")
+
+    with _TOKEN_LOCK:
+        tc = _TOKEN_CACHE
+        if tc["path"] != cache_path or tc["mtime_ns"] != mtime_ns or tc["app"] is None:
+            cache = msal.SerializableTokenCache()
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    cache.deserialize(f.read())
+            except Exception as e:
+                raise RuntimeError(f"Token cache unreadable at {cache_path}: {e}")
+            tc.update(
+                app=msal.PublicClientApplication(CLIENT_ID, authority=AUTHORITY, token_cache=cache),
+                path=cache_path,
+                mtime_ns=mtime_ns,
+                access_token=None,
+                expires_at=0.0,
+            )
+        elif tc["access_token"] and time.time() < tc["expires_at"]:
+            return tc["access_token"]
+
+        app = tc["app"]
+        accounts = app.get_accounts()
+        if not accounts:
+            raise RuntimeError("No Microsoft account found in cache. Re-run ms_auth.py.")
+
+        result = app.acquire_token_silent(RESOURCE_SCOPES, account=accounts[0])
+        if not result or "access_token" not in result:
+            raise RuntimeError("Cannot refresh token silently. Re-run ms_auth.py.")
+        # 60s safety margin so we never hand out a token that expires mid-request
+        tc["access_token"] = result["access_token"]
+        tc["expires_at"] = time.time() + int(result.get("expires_in", 0)) - 60
+        return result["access_token"]
 
 
 # ------------------------------------------------------------------------------
@@ -99,10 +224,8 @@ def _load_token() -> str:
 def _strip_text(s: Optional[str]) -> str:
     if not s:
         return ""
-    s = s.replace("\r", " ").replace("\n", " ").replace("\t", " ")
-    while "  " in s:
-        s = s.replace("  ", " ")
-    return s.strip()
+    # split() on any whitespace run + join: single C-level pass, also trims the ends
+    return " ".join(s.split())
 
 
 def _iso_ago(days: int) -> str:
@@ -110,6 +233,59 @@ def _iso_ago(days: int) -> str:
     return t.strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
+# Graph caps JSON batching at 20 sub-requests per call
+_GRAPH_BATCH_MAX = 20
+
+
+def _history_params(sender: str, since: str) -> dict:
+    return {
+        "$select": "id",
+        "$filter": f"from/emailAddress/address eq '{sender}' and receivedDateTime ge {since}",
+        "$top": "50",
+    }
+
+
+def _history_count(headers: dict, sender: str, since: str) -> int:
+    """Single-sender fallback (plain GET); 0 on any failure."""
+    try:
+        rr = _graph("GET", f"{GRAPH}/me/messages", headers=headers, params=_history_params(sender, since))
+        if rr.status_code == 200:
+            return len(_rjson(rr).get("value", []))
+    except Exception:
+        pass
+    return 0
+
+
+def _sender_history_counts(headers: dict, senders: List[str], since: str) -> Dict[str, int]:
+    """
+    Count recent messages per sender via Graph /$batch (one round-trip per 20 senders).
+    If a batch call fails as a whole, that chunk falls back to parallel single GETs
+    on the shared (thread-safe) client. Per-sender failures degrade to count=0.
+    """
+    counts: Dict[str, int] = {}
+    for off in range(0, len(senders), _GRAPH_BATCH_MAX):
+        chunk = senders[off:off + _GRAPH_BATCH_MAX]
+        reqs = []
+        for j, sender in enumerate(chunk):
+            qs = urlencode(_history_params(sender, since), quote_via=quote, safe="$/',:")
+            reqs.append({"id": str(j), "method": "GET", "url": f"/me/messages?{qs}"})
+        try:
+            r = _graph("POST", f"{GRAPH}/$batch", headers=headers, content=_jbody({"requests": reqs}))
+            batch_ok = r.status_code == 200
+            if batch_ok:
+                for resp in _rjson(r).get("responses", []):
+                    if resp.get("status") == 200:
+                        sender = chunk[int(resp["id"])]
+                        counts[sender] = len((resp.get("body") or {}).get("value", []))
+        except Exception:
+            batch_ok = False
+        if not batch_ok:
+            with ThreadPoolExecutor(max_workers=min(8, len(chunk))) as ex:
+                for sender, cnt in zip(chunk, ex.map(lambda snd: _history_count(headers, snd, since), chunk)):
+                    counts[sender] = cnt
+    return counts
+
+
 # ------------------------------------------------------------------------------
 # TRIAGE CONTEXT (used by integration kind: ms.mail_triage)
 # ------------------------------------------------------------------------------
@@ -120,7 +296,7 @@ def build_inbox_triage_context(n: int = 3, lookback_days: int = 30) -> str:
     and return a compact, LLM-friendly text block.
     """
     token = _load_token()
-    headers = {"Authorization": f"Bearer {token}"}
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
 
     params = {
         "$top": str(n),
@@ -128,10 +304,9 @@ def build_inbox_triage_context(n: int = 3, lookback_days: int = 30) -> str:
         "$select": "id,subject,from,receivedDateTime,bodyPreview",
     }
     try:
-        with httpx.Client(timeout=30) as client:
-            r = client.get(f"{GRAPH}/me/mailFolders/Inbox/messages", headers=headers, params=params)
-            r.raise_for_status()
-            data = r.json()
+        r = _graph("GET", f"{GRAPH}/me/mailFolders/Inbox/messages", headers=headers, params=params)
+        r.raise_for_status()
+        data = _rjson(r)
     except httpx.HTTPStatusError as e:
         raise RuntimeError(f"Graph error (Inbox fetch): {e.response.status_code} {e.response.text[:200]}")
     except Exception as e:
@@ -141,24 +316,19 @@ def build_inbox_triage_context(n: int = 3, lookback_days: int = 30) -> str:
     lines: List[str] = []
     since = _iso_ago(lookback_days)
 
+    def _sender(m: dict) -> str:
+        return ((m.get("from") or {}).get("emailAddress") or {}).get("address", "")
+
+    # Minimal sender history for lookback window: one $batch call for all distinct senders
+    senders = list(dict.fromkeys(s for s in map(_sender, msgs) if s))
+    hist = _sender_history_counts(headers, senders, since)
+
     for i, m in enumerate(msgs, start=1):
         subj = _strip_text(m.get("subject", ""))
         preview = _strip_text(m.get("bodyPreview", ""))
         received = m.get("receivedDateTime", "")
-        sender = ((m.get("from") or {}).get("emailAddress") or {}).get("address", "")
-
-        # Minimal sender history for lookback window
-        hist_count = 0
-        if sender:
-            hist_filter = f"from/emailAddress/address eq '{sender}' and receivedDateTime ge {since}"
-            hist_params = {"$select": "id", "$filter": hist_filter, "$top": "50"}
-            try:
-                with httpx.Client(timeout=30) as client:
-                    rr = client.get(f"{GRAPH}/me/messages", headers=headers, params=hist_params)
-                    if rr.status_code == 200:
-                        hist_count = len(rr.json().get("value", []))
-            except Exception:
-                pass
+        sender = _sender(m)
+        hist_count = hist.get(sender, 0)
 
         lines.append(
             f"[{i}] From: {sender} | Received: {received}\n"
@@ -192,45 +362,101 @@ def calendar_create(subject: str, body: str, start: Optional[str], end: Optional
         "end": {"dateTime": end, "timeZone": "UTC"},
     }
 
-    with httpx.Client(timeout=30) as client:
-        r = client.post(f"{GRAPH}/me/events", headers=headers, json=payload)
-        r.raise_for_status()
-        ev = r.json()
-        return ev.get("webLink", "")
+    r = _graph("POST", f"{GRAPH}/me/events", headers=headers, content=_jbody(payload))
+    r.raise_for_status()
+    ev = _rjson(r)
+    return ev.get("webLink", "")
 
 
 def mail_draft_reply_latest(body_text: str) -> str:
     token = _load_token()
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
 
-    params = {"$top": "1", "$orderby": "receivedDateTime desc", "$select": "id,webLink"}
-    with httpx.Client(timeout=30) as client:
-        r = client.get(f"{GRAPH}/me/mailFolders/Inbox/messages", headers=headers, params=params)
-        r.raise_for_status()
-        vals = r.json().get("value", [])
-        if not vals:
-            raise RuntimeError("No messages to reply to.")
-        msg_id = vals[0]["id"]
+    params = {"$top": "1", "$orderby": "receivedDateTime desc", "$select": "id"}
+    r = _graph("GET", f"{GRAPH}/me/mailFolders/Inbox/messages", headers=headers, params=params)
+    r.raise_for_status()
+    vals = _rjson(r).get("value", [])
+    if not vals:
+        raise RuntimeError("No messages to reply to.")
+    msg_id = vals[0]["id"]
+
+    r2 = _graph("POST", f"{GRAPH}/me/messages/{msg_id}/createReply", headers=headers)
+    r2.raise_for_status()
+    draft = _rjson(r2)
+    draft_id = draft["id"]
+
+    patch = {"body": {"contentType": "text", "content": body_text}}
+    # PATCH hands back the updated draft, webLink included: no follow-up GET
+    r3 = _graph(
+        "PATCH",
+        f"{GRAPH}/me/messages/{draft_id}",
+        headers={**headers, "Prefer": "return=representation"},
+        params={"$select": "id,webLink"},
+        content=_jbody(patch),
+    )
+    r3.raise_for_status()
+    updated = _rjson(r3) if r3.content else {}
+    return updated.get("webLink") or draft.get("webLink") or draft_id
 
-        r2 = client.post(f"{GRAPH}/me/messages/{msg_id}/createReply", headers=headers)
-        r2.raise_for_status()
-        draft = r2.json()
-        draft_id = draft["id"]
 
-        patch = {"body": {"contentType": "text", "content": body_text}}
-        r3 = client.patch(f"{GRAPH}/me/messages/{draft_id}", headers=headers, json=patch)
-        r3.raise_for_status()
+# Graph simple upload is limited to 4 MB; bigger files go through an upload session.
+# Session chunks must be multiples of 320 KiB.
+_SIMPLE_UPLOAD_MAX = 4 * 1024 * 1024
+_UPLOAD_CHUNK = 10 * 320 * 1024
 
-        r4 = client.get(f"{GRAPH}/me/messages/{draft_id}?$select=webLink", headers=headers)
-        if r4.status_code == 200:
-            return r4.json().get("webLink", draft_id)
-        return draft_id
 
+def _upload_session_put(token: str, item_path: str, bio: io.BytesIO) -> dict:
+    """Resumable upload straight from the BytesIO buffer, one bounded chunk at a time."""
+    r = _graph(
+        "POST",
+        f"{GRAPH}{item_path}/createUploadSession",
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        content=_jbody({"item": {"@microsoft.graph.conflictBehavior": "replace"}}),
+    )
+    r.raise_for_status()
+    upload_url = _rjson(r)["uploadUrl"]
+
+    item: dict = {}
+    with bio.getbuffer() as view:
+        total = view.nbytes
+        for start in range(0, total, _UPLOAD_CHUNK):
+            end = min(start + _UPLOAD_CHUNK, total)
+            # uploadUrl is pre-authorized: no bearer header here (Graph rejects it)
+            rr = _graph(
+                "PUT",
+                upload_url,
+                headers={"Content-Range": f"bytes {start}-{end - 1}/{total}"},
+                content=view[start:end].tobytes(),
+                timeout=60,
+            )
+            rr.raise_for_status()
+            if rr.status_code in (200, 201):
+                item = _rjson(rr)
+    return item
+
+
+def _paragraph_xml(line: str) -> str:
+    if not line.strip():
+        return "<w:p/>"
+    # same shape python-docx emits for add_paragraph(line): tabs become <w:tab/>
+    runs = '</w:t><w:tab/><w:t xml:space="preserve">'.join(_xml_escape(seg) for seg in line.split("\t"))
+    return f'<w:p><w:r><w:t xml:space="preserve">{runs}</w:t></w:r></w:p>'
+
+
+def _append_text_paragraphs(doc, text: str) -> None:
+    """
+    One paragraph per line, built as a single XML fragment and spliced in before sectPr.
+    Much cheaper than doc.add_paragraph() per line on long LLM outputs.
+    """
+    lines = text.splitlines()
+    if not lines:
+        return
+    frag = parse_xml(f"<w:body {nsdecls('w')}>" + "".join(map(_paragraph_xml, lines)) + "</w:body>")
+    body = doc.element.body
+    sect = body.sectPr
+    idx = body.index(sect) if sect is not None else len(body)
+    body[idx:idx] = list(frag)
 
-# add at top with other imports
-import io
-from docx import Document
-from docx.shared import Pt
 
 def word_upsert_docx(text: str, file_name: str, folder: Optional[str] = None) -> str:
     """
@@ -257,31 +483,35 @@ def word_upsert_docx(text: str, file_name: str, folder: Optional[str] = None) ->
     # Title + body
     doc.add_heading("Generated by LLM Router", level=1)
     doc.add_paragraph("")
-    for line in (text or "").splitlines():
-        doc.add_paragraph(line if line.strip() else "")
+    _append_text_paragraphs(doc, text or "")
 
     bio = io.BytesIO()
     doc.save(bio)
-    data = bio.getvalue()
+    size = bio.seek(0, io.SEEK_END)
 
     # sanity guard: a valid .docx shouldn't be tiny
-    if len(data) < 800:
+    if size < 800:
         raise RuntimeError("DOCX generation failed (document too small).")
 
     # 2) Upload to OneDrive (create or replace)
     if folder:
-        drive_path = f"/me/drive/root:/{folder}/{file_name}:/content"
+        item_path = f"/me/drive/root:/{folder}/{file_name}:"
     else:
-        drive_path = f"/me/drive/root:/{file_name}:/content"
+        item_path = f"/me/drive/root:/{file_name}:"
 
-    with httpx.Client(timeout=60) as client:
-        r = client.put(f"{GRAPH}{drive_path}", headers=headers, content=data)
+    if size <= _SIMPLE_UPLOAD_MAX:
+        r = _graph("PUT", f"{GRAPH}{item_path}/content", headers=headers, content=bio.getvalue(), timeout=60)
         r.raise_for_status()
-        item = r.json()
-        item_id = item.get("id")
-        if not item_id:
-            return ""
-        r2 = client.get(f"{GRAPH}/me/drive/items/{item_id}?select=webUrl", headers={"Authorization": f"Bearer {token}"})
-        if r2.status_code == 200:
-            return r2.json().get("webUrl", "")
+        item = _rjson(r)
+    else:
+        item = _upload_session_put(token, item_path, bio)
+    # The upload response is the full driveItem, webUrl included; skip the extra round-trip
+    if item.get("webUrl"):
+        return item["webUrl"]
+    item_id = item.get("id")
+    if not item_id:
         return ""
+    r2 = _graph("GET", f"{GRAPH}/me/drive/items/{item_id}?select=webUrl", headers={"Authorization": f"Bearer {token}"})
+    if r2.status_code == 200:
+        return _rjson(r2).get("webUrl", "")
+    return ""
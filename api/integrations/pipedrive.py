@@ -6,20 +6,58 @@
 
 from __future__ import annotations
 
+import atexit
 import datetime as dt
+import importlib.util
 import os
-from typing import Any, Dict, List, Optional
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
 
-import requests
 import time
 import httpx
 
-PD_BASE = (os.getenv("PIPEDRIVE_BASE_URL") or "").rstrip("/")
+try:
+    import orjson  # optional: ~3x faster decode for /deals and mailbox pages
+except Exception:
+    orjson = None
+
+try:
+    import ijson  # pinned in requirements (3.5.1); stream-parse /deals pages instead of loading each one whole
+except Exception:
+    ijson = None
+
+def _rjson(r: httpx.Response) -> Any:
+    return orjson.loads(r.content) if orjson else r.json()
+
+def _pd_api_base() -> str:
+    """Normalized API base ending in '/v1', whether or not PIPEDRIVE_BASE_URL already has it."""
+    base = (os.getenv("PIPEDRIVE_BASE_URL") or "https://api.pipedrive.com").rstrip("/")
+    if base.endswith("/v1"):
+        base = base[:-3]
+    return f"{base}/v1"
+
+PD_BASE = _pd_api_base()
 PD_TOKEN = os.getenv("PIPEDRIVE_API_TOKEN", "")
 
-def _pd_debug(tag: str, data) -> None:
-    if os.getenv("DEBUG_PD", "0") != "1":
-        return
+# Mailbox prefetch knobs (process-lifetime, like the rest of the config above)
+_PD_MAILBOX_FOLDER = os.getenv("PD_MAILBOX_FOLDER", "inbox")
+_PD_CONTEXT_MAX_CHARS = int(os.getenv("PD_CONTEXT_MAX_CHARS", "2500"))
+
+
+class PipedriveError(RuntimeError):
+    pass
+
+
+# Read once at import; call sites also check it so the debug payload isn't even built
+_PD_DEBUG_ENABLED = os.getenv("DEBUG_PD", "0") == "1"
+
+def _pd_debug_impl(tag: str, data) -> None:
     try:
         import json
         def skim(x, depth=0):
@@ -34,42 +72,61 @@ def _pd_debug(tag: str, data) -> None:
     except Exception:
         pass
 
+def _pd_debug_noop(tag: str, data) -> None:
+    return None
+
+_pd_debug = _pd_debug_impl if _PD_DEBUG_ENABLED else _pd_debug_noop
+
 def _pd_client(timeout=30) -> httpx.Client:
-    if not PD_BASE or not PD_TOKEN:
-        raise RuntimeError("Pipedrive not configured: set PIPEDRIVE_BASE_URL and PIPEDRIVE_API_TOKEN in .env")
+    if not PD_TOKEN:
+        raise PipedriveError("Missing PIPEDRIVE_API_TOKEN in environment")
     # Pipedrive v1 API uses api token as query param
     return httpx.Client(
-        base_url=f"{PD_BASE}/api/v1",
-        timeout=timeout,
+        base_url=PD_BASE,
+        timeout=httpx.Timeout(timeout),
         params={"api_token": PD_TOKEN},
         headers={"Accept": "application/json"},
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=300),
+        # HTTP/2 multiplexes the concurrent page/search fan-out over one connection (needs h2)
+        http2=importlib.util.find_spec("h2") is not None,
     )
 
-def _pd_get(path: str, params=None, retries=2, backoff=1.5) -> dict:
-    with _pd_client() as c:
-        attempt = 0
-        while True:
-            try:
-                r = c.get(path, params=params)
-                if r.status_code == 429:
-                    raise httpx.HTTPStatusError("rate limited", request=r.request, response=r)
-                r.raise_for_status()
-                js = r.json()
-                _pd_debug(f"GET {path}", {"status": r.status_code, "data_keys": list(js.keys())})
-                return js
-            except httpx.HTTPStatusError as e:
-                if e.response is not None and e.response.status_code in (429, 500, 502, 503, 504) and attempt < retries:
-                    time.sleep(backoff * (attempt + 1))
-                    attempt += 1
-                    continue
-                txt = e.response.text[:400] if e.response is not None else str(e)
-                raise RuntimeError(f"Pipedrive GET failed {path}: {txt}")
-            except Exception as e:
-                if attempt < retries:
-                    time.sleep(backoff * (attempt + 1))
-                    attempt += 1
-                    continue
-                raise
+# One pooled client for the whole process: keep-alive instead of a TLS handshake per call
+_PD_CLIENT: Optional[httpx.Client] = None
+_PD_CLIENT_LOCK = threading.Lock()
+
+def _get_pd_client() -> httpx.Client:
+    global _PD_CLIENT
+    if _PD_CLIENT is None:
+        with _PD_CLIENT_LOCK:
+            if _PD_CLIENT is None:
+                _PD_CLIENT = _pd_client()
+    return _PD_CLIENT
+
+@atexit.register
+def _close_pd_client() -> None:
+    if _PD_CLIENT is not None:
+        _PD_CLIENT.close()
+
+# Recoverable failures: everything else (4xx) fails fast
+_PD_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+_PD_RETRY_EXC = (httpx.ConnectError, httpx.ReadTimeout)
+_PD_MAX_RETRIES = 3
+
+def _pd_write_retryable(r: httpx.Response) -> bool:
+    """Only statuses that prove a write was not applied: 429, or 503 with an explicit Retry-After."""
+    return r.status_code == 429 or (r.status_code == 503 and "Retry-After" in r.headers)
+
+def _retry_sleep(attempt: int, response: Optional[httpx.Response] = None, base: float = 1.0) -> float:
+    """Seconds to wait: server's Retry-After if given, else capped exponential backoff with jitter."""
+    if response is not None:
+        try:
+            ra = int(response.headers.get("Retry-After", "0"))
+        except ValueError:
+            ra = 0
+        if ra > 0:
+            return min(30.0, float(ra))
+    return min(30.0, base * (2 ** attempt)) * random.uniform(1.0, 1.5)
 
 
 # Reuse your Gmail helpers (already working in this project)
@@ -78,80 +135,331 @@ try:
 except Exception:
     gmail_fetch_newest_thread = None  # allow unit tests without google configured
 
-PD_BASE = os.getenv("PIPEDRIVE_BASE_URL", "https://api.pipedrive.com/v1")
-PD_TOKEN = os.getenv("PIPEDRIVE_API_TOKEN", "")
 
+# Short-lived GET cache: prefetch + post phases of one run hit the same endpoints back to back
+_PD_CACHE: OrderedDict[Tuple[str, Tuple[Tuple[str, str], ...]], Tuple[float, Any]] = OrderedDict()
+_PD_CACHE_LOCK = threading.Lock()
+_PD_CACHE_MAX = 256
+_PD_CACHE_TTL = 30.0
 
-class PipedriveError(RuntimeError):
-    pass
 
+def _pd_cache_key(path: str, params: Optional[Dict[str, Any]]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return path, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
 
-def _pd_request(
+
+def _pd_cache_invalidate(path: str) -> None:
+    """Drop cached GETs under the written resource, e.g. POST /persons -> /persons, /persons/search."""
+    root = "/" + path.strip("/").split("/", 1)[0]
+    with _PD_CACHE_LOCK:
+        for key in [k for k in _PD_CACHE if k[0] == root or k[0].startswith(root + "/")]:
+            del _PD_CACHE[key]
+
+
+def _pd_call(
     path: str,
     method: str = "GET",
     params: Optional[Dict[str, Any]] = None,
     json: Optional[Dict[str, Any]] = None,
     timeout: int = 30,
-) -> Dict[str, Any]:
-    if not PD_TOKEN:
-        raise PipedriveError("Missing PIPEDRIVE_API_TOKEN in environment")
-    params = dict(params or {})
-    params["api_token"] = PD_TOKEN
-    url = f"{PD_BASE}{path}"
-    r = requests.request(method, url, params=params, json=json, timeout=timeout)
+    cache_ttl: Optional[float] = None,
+) -> Any:
+    """Raw call: returns the full JSON envelope (data + additional_data). GETs are TTL-cached."""
+    ttl = _PD_CACHE_TTL if cache_ttl is None else cache_ttl
+    is_get = method.upper() == "GET"
+    key = _pd_cache_key(path, params) if is_get and ttl > 0 else None
+    if key is not None:
+        with _PD_CACHE_LOCK:
+            hit = _PD_CACHE.get(key)
+            if hit and hit[0] > time.monotonic():
+                _PD_CACHE.move_to_end(key)
+                return hit[1]
+
+    # api_token and base URL come from the pooled client.
+    # Writes only retry when the request surely wasn't applied (see _pd_write_retryable) or
+    # never connected; a 502/504 may have been forwarded already.
+    retry_exc = _PD_RETRY_EXC if is_get else (httpx.ConnectError,)
+    attempt = 0
+    while True:
+        try:
+            r = _get_pd_client().request(method, path, params=params, json=json, timeout=timeout)
+        except retry_exc:
+            if attempt < _PD_MAX_RETRIES:
+                time.sleep(_retry_sleep(attempt))
+                attempt += 1
+                continue
+            raise
+        if attempt < _PD_MAX_RETRIES and (
+            r.status_code in _PD_RETRY_STATUS if is_get else _pd_write_retryable(r)
+        ):
+            time.sleep(_retry_sleep(attempt, r))
+            attempt += 1
+            continue
+        break
     if r.status_code >= 400:
         raise PipedriveError(
             f"Pipedrive {method} {path} failed: {r.status_code} {r.text[:300]}"
         )
-    data = r.json() if r.text else {}
+    data = _rjson(r) if r.content else {}
+    if _PD_DEBUG_ENABLED:
+        _pd_debug(f"{method} {path}", {"status": r.status_code, "http": r.http_version})
+
+    if key is not None:
+        with _PD_CACHE_LOCK:
+            _PD_CACHE[key] = (time.monotonic() + ttl, data)
+            _PD_CACHE.move_to_end(key)
+            while len(_PD_CACHE) > _PD_CACHE_MAX:
+                _PD_CACHE.popitem(last=False)
+    elif not is_get:
+        _pd_cache_invalidate(path)
+    return data
+
+
+def _pd_request(
+    path: str,
+    method: str = "GET",
+    params: Optional[Dict[str, Any]] = None,
+    json: Optional[Dict[str, Any]] = None,
+    timeout: int = 30,
+    cache_ttl: Optional[float] = None,
+) -> Dict[str, Any]:
+    data = _pd_call(path, method=method, params=params, json=json, timeout=timeout, cache_ttl=cache_ttl)
     return data.get("data") if isinstance(data, dict) and "data" in data else data
 
 
+_PD_PAGE = 100
+# Pages requested concurrently per round in _pd_list (at most this many - 1 past the end)
+_PD_LIST_WAVE = 2
+# Read-only stand-in for "missing dict" in .get() chains (no fresh {} per miss)
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+# Shared worker pool for overlapping Pipedrive round-trips (the pooled client is thread-safe)
+_PD_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pd")
+
+
+def _page_items(page: Any) -> List[Dict[str, Any]]:
+    if not page:
+        return []
+    items = (
+        page
+        if isinstance(page, list)
+        else page.get("items")
+        or page.get("deals")
+        or page.get("data")
+        or []
+    )
+    if isinstance(items, dict):
+        # Some endpoints return {"items": [{"item": {...}}]}
+        items = items.get("items", [])
+    return [it["item"] if isinstance(it, dict) and "item" in it else it for it in items or []]
+
+
+def _page_next(page: Any, start: int, n_items: int) -> Optional[int]:
+    """next_start if the collection has more items, else None."""
+    if not isinstance(page, dict):
+        return None
+    pag = (page.get("additional_data") or _EMPTY).get("pagination") or _EMPTY
+    if not pag.get("more_items_in_collection", False):
+        return None
+    return pag.get("next_start", start + n_items)
+
+
 def _pd_list(
-    path: str, params: Optional[Dict[str, Any]] = None, limit_pages: int = 5
+    path: str,
+    params: Optional[Dict[str, Any]] = None,
+    limit_pages: int = 5,
+    cache_ttl: Optional[float] = None,
 ) -> List[Dict[str, Any]]:
-    """Page through list endpoints (classic start/limit pagination)."""
+    """
+    Page through list endpoints (classic start/limit pagination).
+    Page 0 is fetched first; if the server says there is more and honours limit=100,
+    the remaining pages are requested concurrently and merged in order.
+    """
+    base = dict(params or {})
+
+    def fetch(start: int):
+        # envelope, not unwrapped data: pagination lives in additional_data
+        return _pd_call(path, params={**base, "start": start, "limit": _PD_PAGE}, cache_ttl=cache_ttl)
+
     out: List[Dict[str, Any]] = []
-    start = 0
-    for _ in range(limit_pages):
-        page = _pd_request(path, params={**(params or {}), "start": start, "limit": 100})
-        if not page:
-            break
-        items = (
-            page
-            if isinstance(page, list)
-            else page.get("items")
-            or page.get("deals")
-            or page.get("data")
-            or []
-        )
-        if isinstance(items, dict):
-            # Some endpoints return {"items": [{"item": {...}}]}
-            items = items.get("items", [])
+    page = fetch(0)
+    items = _page_items(page)
+    if not items:
+        return out
+    out.extend(items)
+    start = _page_next(page, 0, len(items))
+    if start is None or limit_pages <= 1:
+        return out
+
+    if start == _PD_PAGE:
+        # Small waves instead of every remaining page at once: a call past the end of the
+        # collection still counts against the rate limit, so stop once a wave reaches it.
+        i = 1
+        while i < limit_pages:
+            futs = [_PD_POOL.submit(fetch, j * _PD_PAGE) for j in range(i, min(i + _PD_LIST_WAVE, limit_pages))]
+            try:
+                for j, fut in enumerate(futs, i):
+                    page = fut.result()
+                    items = _page_items(page)
+                    if not items:
+                        return out
+                    out.extend(items)
+                    if len(items) < _PD_PAGE or _page_next(page, j * _PD_PAGE, len(items)) is None:
+                        return out
+            finally:
+                for fut in futs:
+                    fut.cancel()
+            i += len(futs)
+        return out
+
+    # Server picked its own page size: walk sequentially from next_start
+    for _ in range(limit_pages - 1):
+        page = fetch(start)
+        items = _page_items(page)
         if not items:
             break
-        for it in items:
-            out.append(it["item"] if isinstance(it, dict) and "item" in it else it)
-        more = (
-            page.get("additional_data", {})
-            .get("pagination", {})
-            .get("more_items_in_collection", False)
-            if isinstance(page, dict)
-            else False
-        )
-        if not more:
+        out.extend(items)
+        start = _page_next(page, start, len(items))
+        if start is None:
             break
-        start = (
-            page.get("additional_data", {})
-            .get("pagination", {})
-            .get("next_start", start + len(items))
-        )
     return out
 
 
+# ---------- Date parsing (shared by the report/prefetch loops) ----------
+
+# Only used when fromisoformat rejects the string (odd suffixes, trailing junk)
+_STRPTIME_FALLBACKS = (
+    (19, "%Y-%m-%d %H:%M:%S"),
+    (10, "%Y-%m-%d"),
+)
+
+
+def _parse_iso(s: Optional[str]) -> Optional[dt.datetime]:
+    """Parse a Pipedrive timestamp to a naive UTC datetime; None if empty/unparseable."""
+    if not s:
+        return None
+    s = s.strip()
+    try:
+        d = dt.datetime.fromisoformat(s[:-1] + "+00:00" if s.endswith("Z") else s)
+    except ValueError:
+        for n, fmt in _STRPTIME_FALLBACKS:
+            try:
+                return dt.datetime.strptime(s[:n], fmt)
+            except ValueError:
+                continue
+        return None
+    if d.tzinfo is not None:
+        d = d.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return d
+
+
+def _parse_date(s: Optional[str]) -> Optional[dt.date]:
+    """'YYYY-MM-DD' (or a timestamp starting with it) -> date; None if empty/unparseable."""
+    if not s:
+        return None
+    try:
+        return dt.date.fromisoformat(s[:10])
+    except ValueError:
+        return None
+
+
 # ---------- Use case (i): stalled deals / missing next step ----------
 
 
+def _pd_stream_items(path: str, params: Dict[str, Any], pagination: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream one list page with ijson: rows are yielded while the body is still arriving,
+    and the page is never materialized as a whole. additional_data.pagination is
+    written into `pagination` once the body has been fully read.
+    Retries like _pd_call (429/5xx, connection errors) as long as no row has been yielded.
+    """
+    attempt = 0
+    yielded = False
+    while True:
+        rows = ijson.sendable_list()
+        pags = ijson.sendable_list()
+        rows_coro = ijson.items_coro(rows, "data.item", use_float=True)
+        pag_coro = ijson.items_coro(pags, "additional_data.pagination", use_float=True)
+        try:
+            with _get_pd_client().stream("GET", path, params=params) as r:
+                if r.status_code in _PD_RETRY_STATUS and attempt < _PD_MAX_RETRIES:
+                    time.sleep(_retry_sleep(attempt, r))
+                    attempt += 1
+                    continue
+                if r.status_code >= 400:
+                    r.read()
+                    raise PipedriveError(f"Pipedrive GET {path} failed: {r.status_code} {r.text[:300]}")
+                for chunk in r.iter_bytes():
+                    rows_coro.send(chunk)
+                    pag_coro.send(chunk)
+                    if rows:
+                        yielded = True
+                        yield from rows
+                        rows.clear()
+        except _PD_RETRY_EXC:
+            if yielded or attempt >= _PD_MAX_RETRIES:
+                raise
+            time.sleep(_retry_sleep(attempt))
+            attempt += 1
+            continue
+        break
+    rows_coro.close()
+    pag_coro.close()
+    yield from rows
+    if pags:
+        pagination.update(pags[0])
+
+
+def _pd_iter_deals(params: Dict[str, Any], limit_pages: int = 5) -> Iterator[Dict[str, Any]]:
+    """Yield /deals rows page by page; stops fetching as soon as the consumer stops iterating."""
+    start = 0
+    for _ in range(limit_pages):
+        page_params = {**params, "start": start, "limit": _PD_PAGE}
+        if ijson is not None:
+            pag: Dict[str, Any] = {}
+            n = 0
+            for d in _pd_stream_items("/deals", page_params, pag):
+                n += 1
+                yield d
+            if not n or not pag.get("more_items_in_collection", False):
+                return
+            start = pag.get("next_start", start + n)
+            continue
+
+        page = _pd_call("/deals", params=page_params)
+        items = _page_items(page)
+        if not items:
+            return
+        yield from items
+        start = _page_next(page, start, len(items))
+        if start is None:
+            return
+
+
+@dataclass(slots=True)
+class _Deal:
+    """Just the /deals columns the report reads; slots -> attribute access, no per-row dict."""
+    id: Any
+    title: str
+    person_name: str
+    org_name: str
+    value: Any
+    currency: str
+    next_activity_date: Optional[str]
+    update_time: Optional[str]
+
+    @classmethod
+    def from_row(cls, d: Mapping[str, Any]) -> "_Deal":
+        return cls(
+            d.get("id"),
+            d.get("title") or "(untitled)",
+            d.get("person_name") or "",
+            d.get("org_name") or "",
+            d.get("value") or 0,
+            d.get("currency") or "",
+            d.get("next_activity_date"),
+            d.get("update_time") or d.get("update_time_utc"),
+        )
+
+
 def stalled_deals_report(
     *, days_stalled: int = 10, only_missing_next_step: bool = True, **_
 ) -> str:
@@ -164,47 +472,30 @@ def stalled_deals_report(
     today = dt.date.today()
     cutoff = dt.datetime.utcnow() - dt.timedelta(days=days_stalled)
 
-    deals = _pd_list("/deals", params={"status": "open", "sort": "update_time DESC"})
+    # Oldest first: every deal after the first one newer than cutoff is fresh too, so we can
+    # stop reading (and paging) right there. Lines are reversed at the end -> newest first.
     lines: List[str] = []
-    for d in deals:
-        next_act = d.get("next_activity_date")
-        upd_str = d.get("update_time") or d.get("update_time_utc") or ""
-        try:
-            last_upd = (
-                dt.datetime.fromisoformat(upd_str.replace("Z", "+00:00")).replace(tzinfo=None)
-                if upd_str
-                else None
-            )
-        except Exception:
-            last_upd = None
-
-        missing_next = not next_act
-        overdue_next = False
-        if next_act:
-            try:
-                overdue_next = dt.datetime.strptime(next_act, "%Y-%m-%d").date() < today
-            except Exception:
-                overdue_next = False
+    for row in _pd_iter_deals({"status": "open", "sort": "update_time ASC"}):
+        d = _Deal.from_row(row)
+        last_upd = _parse_iso(d.update_time)
+        if last_upd and last_upd > cutoff:
+            break
 
+        missing_next = not d.next_activity_date
         if only_missing_next_step and not missing_next:
             continue
-        if last_upd and last_upd > cutoff:
-            continue
 
-        title = d.get("title") or "(untitled)"
-        person = d.get("person_name") or ""
-        org = d.get("org_name") or ""
-        value = d.get("value") or 0
-        currency = d.get("currency") or ""
-        deal_id = d.get("id")
+        next_date = _parse_date(d.next_activity_date)
+        overdue_next = next_date is not None and next_date < today
 
         why = "missing next step" if missing_next else ("next step overdue" if overdue_next else "stalled")
         lines.append(
-            f"- Deal #{deal_id}: {title} — {person} / {org} — {value}{currency} — {why}"
+            f"- Deal #{d.id}: {d.title} — {d.person_name} / {d.org_name} — {d.value}{d.currency} — {why}"
         )
 
     if not lines:
         return "No stalled deals found with the given criteria."
+    lines.reverse()
 
     return "\n".join(
         [
@@ -217,6 +508,19 @@ def stalled_deals_report(
 # ---------- Use case (ii): decide if a new email is a lead ----------
 
 
+# "<addr>" (group 1) or a bare addr@host token (group 2)
+_EMAIL_RE = re.compile(r"<([^>]+)>|([^\s<>,]+@[^\s<>,]+)")
+
+
+def _msg_headers(msg: Mapping[str, Any]) -> Dict[str, str]:
+    """Lower-cased headers; works both for Google API payload headers and flat dicts."""
+    headers_list = (msg.get("payload") or _EMPTY).get("headers")
+    if isinstance(headers_list, list) and headers_list:
+        return {h.get("name", "").lower(): h.get("value", "") for h in headers_list if isinstance(h, dict)}
+    return {k.lower(): v for k, v in msg.items() if isinstance(k, str)}
+
+
+
 def email_lead_from_gmail(**_) -> str:
     """
     Prefetches the newest Gmail thread and returns a short context for the LLM to decide lead/non-lead.
@@ -233,18 +537,11 @@ def email_lead_from_gmail(**_) -> str:
         return (data if len(data) <= 2000 else (data[:2000] + "\n[... trimmed ...]"))
 
     # Otherwise, we expect a dict in one of a few shapes.
-    def _hdrs(msg: Dict[str, Any]) -> Dict[str, str]:
-        # Works both for Google API payload headers and flat dicts
-        headers_list = (msg.get("payload", {}) or {}).get("headers", [])
-        if isinstance(headers_list, list) and headers_list:
-            return {h.get("name", "").lower(): h.get("value", "") for h in headers_list if isinstance(h, dict)}
-        return {k.lower(): v for k, v in msg.items() if isinstance(k, str)}
-
     # Pick the newest message we can find
     msg = None
     if isinstance(data, dict):
         if "threads" in data:
-            th = (data.get("threads") or [{}])[0] or {}
+            th = (data.get("threads") or (_EMPTY,))[0] or _EMPTY
             msgs = th.get("messages") or []
             msg = msgs[-1] if msgs else th  # fall back to thread-level dict
         elif "messages" in data:
@@ -256,7 +553,7 @@ def email_lead_from_gmail(**_) -> str:
         # Unexpected type (not str, not dict) — return safe string
         return f"{str(data)[:2000]}\n[... trimmed or unknown shape ...]"
 
-    headers = _hdrs(msg or {})
+    headers = _msg_headers(msg or _EMPTY)
     subject = headers.get("subject") or msg.get("subject") or "(no subject)"
     from_h = headers.get("from") or msg.get("from") or "(unknown)"
     to_h = headers.get("to") or msg.get("to") or ""
@@ -277,6 +574,19 @@ def email_lead_from_gmail(**_) -> str:
 
 # ---------- Use case (iii): summarize full long email thread & write PD note ----------
 
+# The prefetch and post phases of one run both need the newest thread; fetch it once per minute
+_GMAIL_LAST: Dict[str, Any] = {"t": 0.0, "data": None}
+_GMAIL_TTL_S = 60.0
+
+
+def _cached_gmail() -> Any:
+    now = time.monotonic()
+    if _GMAIL_LAST["data"] is None or now - _GMAIL_LAST["t"] >= _GMAIL_TTL_S:
+        _GMAIL_LAST["data"] = gmail_fetch_newest_thread()
+        _GMAIL_LAST["t"] = now
+    return _GMAIL_LAST["data"]
+
+
 
 def summarize_gmail_thread_and_note(
     *, llm_summary: Optional[str] = None, **_
@@ -288,13 +598,7 @@ def summarize_gmail_thread_and_note(
     if gmail_fetch_newest_thread is None:
         return "Gmail not configured."
 
-    def _headers_from_msg(m: Dict[str, Any]) -> Dict[str, str]:
-        headers_list = (m.get("payload", {}) or {}).get("headers", [])
-        if isinstance(headers_list, list) and headers_list:
-            return {h.get("name", "").lower(): h.get("value", "") for h in headers_list if isinstance(h, dict)}
-        return {k.lower(): v for k, v in m.items() if isinstance(k, str)}
-
-    data = gmail_fetch_newest_thread()
+    data = _cached_gmail()
     if not data:
         return "No Gmail threads available."
 
@@ -306,7 +610,7 @@ def summarize_gmail_thread_and_note(
             # Build a compact, ordered text from messages we can find
             msgs = []
             if "threads" in data:
-                th = (data.get("threads") or [{}])[0] or {}
+                th = (data.get("threads") or (_EMPTY,))[0] or _EMPTY
                 msgs = th.get("messages") or []
             elif "messages" in data:
                 msgs = data.get("messages") or []
@@ -314,7 +618,7 @@ def summarize_gmail_thread_and_note(
             lines: List[str] = []
             if msgs:
                 for m in msgs:
-                    hdr = _headers_from_msg(m or {})
+                    hdr = _msg_headers(m or _EMPTY)
                     who = hdr.get("from") or m.get("from") or "(unknown)"
                     when = hdr.get("date") or m.get("date") or ""
                     snippet = m.get("snippet") or m.get("text") or ""
@@ -332,14 +636,15 @@ def summarize_gmail_thread_and_note(
 
         return text[:8000] if len(text) > 8000 else text
 
-    # Post phase: create PD note and try to link to a person by email (sender of last message)
-    # We re-fetch so we can read the last sender robustly; if this fails we still create a note without person_id.
-    data2 = data if isinstance(data, dict) else (gmail_fetch_newest_thread() or {})
+    # Post phase: create PD note and try to link to a person by email (sender of last message).
+    # `data` is the same (cached) fetch the prefetch phase summarized; a str result has no sender
+    # to read, so we still create a note without person_id.
+    data2 = data
     last_sender_email = None
     if isinstance(data2, dict):
         msg = None
         if "threads" in data2:
-            th = (data2.get("threads") or [{}])[0] or {}
+            th = (data2.get("threads") or (_EMPTY,))[0] or _EMPTY
             msgs = th.get("messages") or []
             msg = msgs[-1] if msgs else th
         elif "messages" in data2:
@@ -347,16 +652,11 @@ def summarize_gmail_thread_and_note(
             msg = msgs[-1] if msgs else data2
         else:
             msg = data2
-        hdr = _headers_from_msg(msg or {})
+        hdr = _msg_headers(msg or _EMPTY)
         from_h = hdr.get("from") or msg.get("from") or ""
-        # crude parse "Name <email@x>"
-        if "<" in from_h and ">" in from_h:
-            try:
-                last_sender_email = from_h.split("<", 1)[1].split(">", 1)[0].strip()
-            except Exception:
-                last_sender_email = None
-        if not last_sender_email and "@" in from_h:
-            last_sender_email = from_h.strip()
+        # "Name <email@x>" or a bare address
+        m = _EMAIL_RE.search(from_h)
+        last_sender_email = (m.group(1) or m.group(2)).strip() if m else None
 
     note_body = f"Gmail thread summary (auto):\n\n{llm_summary}"
     note_payload: Dict[str, Any] = {"content": note_body}
@@ -391,10 +691,10 @@ def inbox_lead_actions_prefetch(
     a Persons-based heuristic using last_incoming_mail_time / last_outgoing_mail_time / next_activity_date.
     The output is ASCII-only and numbered so the LLM can reference items reliably.
     """
-    max_chars = int(os.getenv("PD_CONTEXT_MAX_CHARS", "2500"))
+    max_chars = _PD_CONTEXT_MAX_CHARS
     # ---------- Attempt 1: Mailbox threads ----------
     since = (dt.datetime.utcnow() - dt.timedelta(days=lookback_days)).strftime("%Y-%m-%d")
-    folder = os.getenv("PD_MAILBOX_FOLDER", "inbox")
+    folder = _PD_MAILBOX_FOLDER
     try:
         threads = _pd_list(
             "/mailbox/mailThreads",
@@ -404,6 +704,7 @@ def inbox_lead_actions_prefetch(
         threads = []
 
     lines: List[str] = []
+    total_chars = 0
     idx = 1
     for t in threads or []:
         if len(lines) >= max_threads:
@@ -440,13 +741,11 @@ def inbox_lead_actions_prefetch(
 
         overdue_hint = ""
         if last_time:
-            try:
-                last_dt = dt.datetime.fromisoformat(last_time.replace("Z", "+00:00")).replace(tzinfo=None)
+            last_dt = _parse_iso(last_time)
+            if last_dt is not None:
                 hours_since = (dt.datetime.utcnow() - last_dt).total_seconds() / 3600.0
                 if hours_since >= consider_if_no_reply_hours:
                     overdue_hint = f" | overdue_possible (>{consider_if_no_reply_hours}h since last touch)"
-            except Exception:
-                pass
 
         item = (
             f"[EMAIL {idx}]\n"
@@ -456,10 +755,11 @@ def inbox_lead_actions_prefetch(
             f"Status: {status}{overdue_hint}"
         )
         lines.append(item)
+        total_chars += len(item)
         idx += 1
 
         # Early cap to keep context small
-        if sum(len(x) for x in lines) >= max_chars:
+        if total_chars >= max_chars:
             break
 
     if lines:
@@ -481,24 +781,11 @@ def inbox_lead_actions_prefetch(
         )
         return msg[:max_chars]
 
-    def _parse_dt(s: Optional[str]) -> Optional[dt.datetime]:
-        if not s:
-            return None
-        s = s.strip()
-        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-            try:
-                return dt.datetime.strptime(s[:19], fmt) if fmt != "%Y-%m-%d" else dt.datetime.strptime(s[:10], fmt)
-            except Exception:
-                continue
-        try:
-            return dt.datetime.fromisoformat(s.replace("Z", "+00:00")).replace(tzinfo=None)
-        except Exception:
-            return None
-
     now = dt.datetime.utcnow()
     cutoff = now - dt.timedelta(days=lookback_days)
 
     out: List[str] = []
+    total_chars = 0
     idx = 1
     for person in persons:
         if len(out) >= max_threads:
@@ -514,15 +801,10 @@ def inbox_lead_actions_prefetch(
                     if e.get("primary"):
                         break
 
-        last_in = _parse_dt(person.get("last_incoming_mail_time"))
-        last_out = _parse_dt(person.get("last_outgoing_mail_time"))
+        last_in = _parse_iso(person.get("last_incoming_mail_time"))
+        last_out = _parse_iso(person.get("last_outgoing_mail_time"))
         next_act_date_s = person.get("next_activity_date")
-        next_act_date = None
-        if next_act_date_s:
-            try:
-                next_act_date = dt.datetime.strptime(next_act_date_s, "%Y-%m-%d")
-            except Exception:
-                next_act_date = None
+        next_act_date = _parse_date(next_act_date_s)
 
         most_recent = max([t for t in (last_in, last_out) if t is not None], default=None)
         if not most_recent or most_recent < cutoff:
@@ -537,7 +819,7 @@ def inbox_lead_actions_prefetch(
                 overdue_hint = f" | overdue_possible (>{consider_if_no_reply_hours}h since inbound)"
         elif last_out:
             status = "awaiting_their_reply"
-            if next_act_date is None or next_act_date.date() < dt.date.today():
+            if next_act_date is None or next_act_date < dt.date.today():
                 overdue_hint = " | follow_up_missing_or_overdue"
 
         item = (
@@ -548,9 +830,10 @@ def inbox_lead_actions_prefetch(
             f"Status: {status}{overdue_hint}"
         )
         out.append(item)
+        total_chars += len(item)
         idx += 1
 
-        if sum(len(x) for x in out) >= max_chars:
+        if total_chars >= max_chars:
             break
 
     if not out:
@@ -593,7 +876,7 @@ def pd_mail_lead_prefetch(
     Use Pipedrive Mailbox to pull the newest inbox thread and return a compact lead-decision context.
     No Gmail usage. ASCII-only, small, safe for tiny local models.
     """
-    folder = os.getenv("PD_MAILBOX_FOLDER", "inbox")
+    folder = _PD_MAILBOX_FOLDER
     since = (dt.datetime.utcnow() - dt.timedelta(days=lookback_days)).strftime("%Y-%m-%d")
     try:
         threads = _pd_list(
@@ -659,7 +942,7 @@ def pd_thread_context_prefetch(
     Build a compact plain-text transcript from the newest PD mailbox thread.
     Returns a newline-joined text safe to feed to an LLM for summarization.
     """
-    folder = os.getenv("PD_MAILBOX_FOLDER", "inbox")
+    folder = _PD_MAILBOX_FOLDER
     since = (dt.datetime.utcnow() - dt.timedelta(days=lookback_days)).strftime("%Y-%m-%d")
     try:
         threads = _pd_list(
@@ -690,6 +973,7 @@ def pd_thread_context_prefetch(
         return header[:max_chars]
 
     lines: List[str] = []
+    total_chars = 0
     count = 0
     for m in msgs:
         if count >= max_messages:
@@ -707,15 +991,47 @@ def pd_thread_context_prefetch(
             or (m.get("body") or "").replace("\r", " ").replace("\n", " ")
         )
         snippet = (snippet or "")[:500]
-        lines.append(f"{when} - {frm}: {snippet}")
+        line = f"{when} - {frm}: {snippet}"
+        lines.append(line)
+        total_chars += len(line)
         count += 1
-        if sum(len(x) for x in lines) >= max_chars:
+        if total_chars >= max_chars:
             break
 
     text = "\n".join(lines)
     return text[:max_chars]
 
 
+def _pd_search_person(email: str) -> Optional[Any]:
+    res = _pd_request("/persons/search", params={"term": email})
+    items = res.get("items", []) if isinstance(res, dict) else []
+    if items:
+        return items[0].get("item", {}).get("id")
+    return None
+
+
+def _pd_find_person_id(emails: List[str]) -> Optional[Any]:
+    """
+    Run /persons/search for every email concurrently; first hit wins and the
+    not-yet-started lookups are cancelled. Failed lookups are ignored.
+    """
+    if not emails:
+        return None
+    futs = [_PD_POOL.submit(_pd_search_person, em) for em in emails]
+    try:
+        for fut in as_completed(futs):
+            try:
+                pid = fut.result()
+            except Exception:
+                continue
+            if pid:
+                return pid
+    finally:
+        for fut in futs:
+            fut.cancel()
+    return None
+
+
 def summarize_pdmail_thread_and_note(
     *, llm_summary: Optional[str] = None, **_
 ) -> Optional[str]:
@@ -727,7 +1043,7 @@ def summarize_pdmail_thread_and_note(
         return pd_thread_context_prefetch()
 
     # Resolve participants and try to find a Person; if none, create one from last sender
-    folder = os.getenv("PD_MAILBOX_FOLDER", "inbox")
+    folder = _PD_MAILBOX_FOLDER
     try:
         threads = _pd_list(
             "/mailbox/mailThreads",
@@ -740,38 +1056,26 @@ def summarize_pdmail_thread_and_note(
     person_id = None
     last_sender_name = None
     last_sender_email = None
-    emails_to_try: List[str] = []
 
     if threads:
         th = threads[0]
-        # Collect emails from participants
-        for p in (th.get("participants") or []):
-            em = p.get("email")
-            if em:
-                emails_to_try.append(em)
-        # Also check last message sender
-        msgs = _pd_thread_messages(th.get("id"), limit_pages=1)
+        # Last-message fetch runs on the pool while we search the participants we already know.
+        # limit_pages=1 keeps it from fanning out into the same pool.
+        msgs_fut = _PD_POOL.submit(_pd_thread_messages, th.get("id"), 1)
+        participants = list(dict.fromkeys(
+            p.get("email") for p in (th.get("participants") or []) if p.get("email")
+        ))
+        person_id = _pd_find_person_id(participants)
+
+        msgs = msgs_fut.result()
         if msgs:
             who = msgs[-1].get("from")
             if isinstance(who, dict):
                 last_sender_name = who.get("name") or None
                 last_sender_email = who.get("email") or None
-                if last_sender_email:
-                    emails_to_try.append(last_sender_email)
-
-    # Deduplicate
-    emails_to_try = list({e for e in emails_to_try if e})
-
-    # Try to find an existing person
-    for em in emails_to_try:
-        try:
-            res = _pd_request("/persons/search", params={"term": em})
-            items = res.get("items", []) if isinstance(res, dict) else []
-            if items:
-                person_id = items[0].get("item", {}).get("id")
-                break
-        except Exception:
-            continue
+        # Only the last sender is left to try if the participants didn't match
+        if person_id is None and last_sender_email and last_sender_email not in participants:
+            person_id = _pd_find_person_id([last_sender_email])
 
     # If still none, create a minimal person using last sender
     if person_id is None and last_sender_email:
@@ -17,18 +17,105 @@ Notes:
 
 from __future__ import annotations
 import base64
+import binascii
+import functools
+import hashlib
 import io
-from typing import Any, Dict, List, Optional
+import json
+import random
+import tempfile
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Final, List, Mapping, Optional
 try:
-    from docx import Document  # used only for resume .docx reading
+    import orjson  # optional: faster decode of candidate records / attachment lists
+    _loads = orjson.loads
+except Exception:
+    _loads = json.loads
+try:
+    from lxml import etree as _lxml_etree  # C iterparse that can filter tags; python-docx pulls it in anyway
+except Exception:
+    _lxml_etree = None
+try:
+    from docx import Document  # fallback only, when the fast zip/xml reader can't open the file
 except Exception:
     Document = None  # allow module import even if python-docx isn't installed; handled at call time
 
+import atexit
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One pooled session for all Zoho calls: keep-alive + TLS reuse instead of a handshake per request.
+# Retry only covers GETs (urllib3 default allowed_methods); POST token refresh is not retried here.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False),
+))
+atexit.register(_SESSION.close)
 
 # ---- DC helpers + token cache ----
 _token_cache: Dict[str, Any] = {"token": None, "ts": 0}
+# Refreshed tokens are also kept on disk so a fresh worker skips the accounts round-trip.
+# Per-process jitter on the 50 min window keeps workers started together from refreshing together.
+_TOKEN_FILE = os.path.join(tempfile.gettempdir(), "zoho_token.json")
+_TOKEN_TTL_S = 50 * 60 + random.uniform(-60, 60)
+# Serializes refresh/drop so a fan-out of workers triggers one accounts round-trip, not one each
+_TOKEN_LOCK = threading.Lock()
+
+
+def _token_owner(rt: str, cid: str) -> str:
+    # ties the file to this refresh token / client without storing either
+    return hashlib.sha256(f"{cid}:{rt}".encode()).hexdigest()[:16]
+
+
+def _load_disk_token(owner: str) -> bool:
+    try:
+        with open(_TOKEN_FILE, "r", encoding="utf-8") as f:
+            js = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not isinstance(js, dict) or js.get("owner") != owner or not js.get("token"):
+        return False
+    ts = float(js.get("ts") or 0)
+    if time.time() - ts >= _TOKEN_TTL_S:
+        return False
+    _token_cache["token"] = js["token"]
+    _token_cache["ts"] = ts
+    return True
+
+
+def _save_disk_token(owner: str, tok: str, ts: float) -> None:
+    try:
+        fd, tmp = tempfile.mkstemp(prefix=".zoho_token.", dir=os.path.dirname(_TOKEN_FILE))  # created 0600
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"owner": owner, "token": tok, "ts": ts}, f)
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, _TOKEN_FILE)
+    except OSError:
+        pass  # disk cache is best-effort
+
+
+def _drop_token(stale: Optional[str] = None) -> None:
+    """Forget the cached token; with `stale`, only if no other thread has replaced it already."""
+    with _TOKEN_LOCK:
+        if stale is not None and _token_cache["token"] != stale:
+            return
+        _token_cache["token"] = None
+        _token_cache["ts"] = 0
+        try:
+            os.remove(_TOKEN_FILE)
+        except OSError:
+            pass
 
 def _infer_region_from_base_url() -> Optional[str]:
     url = (
@@ -46,65 +133,122 @@ def _infer_region_from_base_url() -> Optional[str]:
     if "zoho.com" in url: return "com"
     return (os.getenv("ZOHO_REGION") or "eu").strip().lower()
 
+_ACCOUNTS_HOSTS: Final[Mapping[str, str]] = MappingProxyType({
+    "eu": "accounts.zoho.eu",
+    "com": "accounts.zoho.com",
+    "in": "accounts.zoho.in",
+    "au": "accounts.zoho.com.au",
+    "jp": "accounts.zoho.jp",
+    "sa": "accounts.zoho.sa",
+    "ca": "accounts.zoho.ca",
+})
+_RECRUIT_HOSTS: Final[Mapping[str, str]] = MappingProxyType({
+    "eu": "recruit.zoho.eu",
+    "com": "recruit.zoho.com",
+    "in": "recruit.zoho.in",
+    "au": "recruit.zoho.com.au",
+    "jp": "recruit.zoho.jp",
+    "sa": "recruit.zoho.sa",
+    "ca": "recruit.zoho.ca",
+})
+
+
 def _accounts_host_for_region(region: str) -> str:
-    return {
-        "eu": "accounts.zoho.eu",
-        "com": "accounts.zoho.com",
-        "in": "accounts.zoho.in",
-        "au": "accounts.zoho.com.au",
-        "jp": "accounts.zoho.jp",
-        "sa": "accounts.zoho.sa",
-        "ca": "accounts.zoho.ca",
-    }.get(region, "accounts.zoho.eu")
+    return _ACCOUNTS_HOSTS.get(region, "accounts.zoho.eu")
+
+
+@dataclass(frozen=True)
+class _Settings:
+    base_url: str
+    accounts_host: str
+    org_id: Optional[str]
+    refresh_token: str = field(repr=False)
+    client_id: str
+    client_secret: str = field(repr=False)
+    access_token: Optional[str] = field(repr=False)  # static fallback
+
+    @property
+    def can_refresh(self) -> bool:
+        return bool(self.refresh_token and self.client_id and self.client_secret)
+
+
+@functools.lru_cache(maxsize=1)
+def _settings() -> _Settings:
+    """Zoho env read once per process (env changes need a restart, like the rest of the app)."""
+    # Prefer explicit base URL; accept both keys + a common typo for resilience.
+    override = (
+        os.getenv("ZOHO_RECRUIT_BASE_URL")
+        or os.getenv("ZOHO_RECRUIT_API_BASE")
+        or os.getenv("OHO_RECRUIT_BASE_URL")  # typo-tolerant
+    )
+    if override:
+        base_url = override.rstrip("/")
+    else:
+        # Fallback: region-based host mapping
+        region = (os.getenv("ZOHO_REGION", "eu") or "eu").strip().lower()
+        base_url = f"https://{_RECRUIT_HOSTS.get(region, 'recruit.zoho.eu')}/recruit/v2"
+    return _Settings(
+        base_url=base_url,
+        accounts_host=os.getenv("ZOHO_ACCOUNTS_HOST") or _accounts_host_for_region(_infer_region_from_base_url() or "eu"),
+        org_id=os.getenv("ZOHO_ORG_ID") or None,
+        refresh_token=(os.getenv("ZOHO_REFRESH_TOKEN") or "").strip(),
+        client_id=(os.getenv("ZOHO_CLIENT_ID") or "").strip(),
+        client_secret=(os.getenv("ZOHO_CLIENT_SECRET") or "").strip(),
+        access_token=os.getenv("ZOHO_ACCESS_TOKEN") or None,
+    )
 
 
 def _access_token() -> str:
     """
     Prefer refresh flow (correct DC, long-lived) when available; else use static token.
-    Cache tokens for ~50 minutes.
+    Cache tokens for ~50 minutes (in memory, and on disk for refreshed tokens).
     """
-    import time as _t
-
     # serve cached token if fresh
-    if _token_cache["token"] and (_t.time() - (_token_cache["ts"] or 0) < 50 * 60):
+    if _token_cache["token"] and (time.time() - (_token_cache["ts"] or 0) < _TOKEN_TTL_S):
         return _token_cache["token"]  # type: ignore[return-value]
 
-    rt = (os.getenv("ZOHO_REFRESH_TOKEN") or "").strip()
-    cid = (os.getenv("ZOHO_CLIENT_ID") or "").strip()
-    cs = (os.getenv("ZOHO_CLIENT_SECRET") or "").strip()
-
-    # If refresh triplet is provided, use it (more reliable than static access tokens)
-    if rt and cid and cs:
-        region = _infer_region_from_base_url()
-        accounts_host = os.getenv("ZOHO_ACCOUNTS_HOST", _accounts_host_for_region(region or "eu"))
-        url = f"https://{accounts_host}/oauth/v2/token"
-        r = requests.post(
-            url,
-            data={
-                "grant_type": "refresh_token",
-                "refresh_token": rt,
-                "client_id": cid,
-                "client_secret": cs,
-            },
-            timeout=30,
-        )
-        r.raise_for_status()
-        js = r.json()
-        tok = js.get("access_token")
+    with _TOKEN_LOCK:
+        # another thread may have refreshed while we waited
+        if _token_cache["token"] and (time.time() - (_token_cache["ts"] or 0) < _TOKEN_TTL_S):
+            return _token_cache["token"]  # type: ignore[return-value]
+
+        cfg = _settings()
+        rt, cid, cs = cfg.refresh_token, cfg.client_id, cfg.client_secret
+
+        # If refresh triplet is provided, use it (more reliable than static access tokens)
+        if cfg.can_refresh:
+            owner = _token_owner(rt, cid)
+            if _token_cache["token"] is None and _load_disk_token(owner):
+                return _token_cache["token"]  # type: ignore[return-value]
+            url = f"https://{cfg.accounts_host}/oauth/v2/token"
+            r = _SESSION.post(
+                url,
+                data={
+                    "grant_type": "refresh_token",
+                    "refresh_token": rt,
+                    "client_id": cid,
+                    "client_secret": cs,
+                },
+                timeout=30,
+            )
+            r.raise_for_status()
+            js = r.json()
+            tok = js.get("access_token")
+            if not tok:
+                raise RuntimeError("Zoho refresh returned no access_token")
+            _token_cache["token"] = tok
+            _token_cache["ts"] = time.time()
+            _save_disk_token(owner, tok, _token_cache["ts"])
+            return tok
+
+        # Fallback: static access token from env
+        tok = cfg.access_token
         if not tok:
-            raise RuntimeError("Zoho refresh returned no access_token")
+            raise RuntimeError("Missing ZOHO_ACCESS_TOKEN or (ZOHO_REFRESH_TOKEN + ZOHO_CLIENT_ID + ZOHO_CLIENT_SECRET)")
         _token_cache["token"] = tok
-        _token_cache["ts"] = _t.time()
+        _token_cache["ts"] = time.time()
         return tok
 
-    # Fallback: static access token from env
-    tok = os.getenv("ZOHO_ACCESS_TOKEN")
-    if not tok:
-        raise RuntimeError("Missing ZOHO_ACCESS_TOKEN or (ZOHO_REFRESH_TOKEN + ZOHO_CLIENT_ID + ZOHO_CLIENT_SECRET)")
-    _token_cache["token"] = tok
-    _token_cache["ts"] = _t.time()
-    return tok
-
 
 
 
@@ -116,62 +260,217 @@ except Exception:
 
 
 # --------- Resume prefetch (.docx <=10MB) ----------
-def prefetch_resume_b64(b64: str, filename: str = "resume.docx", **_) -> str:
-    if Document is None:
-        return "Server is missing python-docx; please add it to requirements and rebuild."
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_T, _W_P, _W_TAB, _W_BR, _W_CR = _W + "t", _W + "p", _W + "tab", _W + "br", _W + "cr"
+_W_TR, _W_TC, _W_TXBX = _W + "tr", _W + "tc", _W + "txbxContent"
+# Text boxes are stored twice (DrawingML in mc:Choice, VML copy in mc:Fallback); read only the first
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_DOCX_TAGS = (_W_T, _W_P, _W_TAB, _W_BR, _W_CR, _W_TR, _W_TC, _W_TXBX, _MC_FALLBACK)
+_XML_ERRORS = (ET.ParseError,) + ((_lxml_etree.XMLSyntaxError,) if _lxml_etree is not None else ())
+
+
+def _iter_docx_events(fh):
+    # lxml drops non-matching elements (runs, props, ...) in C before they reach Python
+    if _lxml_etree is not None:
+        return _lxml_etree.iterparse(fh, events=("start", "end"), tag=_DOCX_TAGS, resolve_entities=False)
+    return ET.iterparse(fh, events=("start", "end"))
+
+
+def _docx_text_xml(raw: bytes) -> str:
+    """
+    Stream word/document.xml straight out of the zip: paragraphs one per line,
+    table rows as "cell | cell", text boxes inline in the paragraph that anchors them.
+    Skips python-docx's object model entirely.
+    """
+    out: List[str] = []
+    paras: List[List[str]] = []  # open <w:p> (stack -> paragraphs nested in text boxes)
+    rows: List[List[str]] = []   # open <w:tr> (stack -> nested tables)
+    blocks: List[List[str]] = [] # paragraphs of the innermost open <w:tc> / <w:txbxContent>
+    skip = 0                     # depth inside mc:Fallback
+    with zipfile.ZipFile(io.BytesIO(raw)) as zf, zf.open("word/document.xml") as fh:
+        for ev, el in _iter_docx_events(fh):
+            tag = el.tag
+            if tag == _MC_FALLBACK:
+                skip += 1 if ev == "start" else -1
+                if ev == "end":
+                    el.clear()
+                continue
+            if skip:
+                continue
+            if ev == "start":
+                if tag == _W_P:
+                    paras.append([])
+                elif tag == _W_TR:
+                    rows.append([])
+                elif tag == _W_TC or tag == _W_TXBX:
+                    blocks.append([])
+                continue
+            if tag == _W_T:
+                if el.text and paras:
+                    paras[-1].append(el.text)
+            elif tag == _W_TAB:
+                if paras:
+                    paras[-1].append("\t")
+            elif tag == _W_BR or tag == _W_CR:
+                if paras:
+                    paras[-1].append("\n")
+            elif tag == _W_P:
+                t = "".join(paras.pop()).strip()
+                if blocks:
+                    blocks[-1].append(t)
+                elif t:
+                    out.append(t)
+            elif tag == _W_TXBX:
+                t = "\n".join(p for p in blocks.pop() if p)
+                if t:
+                    (paras[-1] if paras else blocks[-1] if blocks else out).append(t)
+            elif tag == _W_TC:
+                c = "\n".join(blocks.pop()).strip()
+                if rows:
+                    rows[-1].append(c)
+            elif tag == _W_TR:
+                line = " | ".join(c for c in rows.pop() if c)
+                if line:
+                    (blocks[-1] if blocks else out).append(line)
+            el.clear()
+    return "\n".join(out).strip()
+
+
+def _docx_text_python_docx(raw: bytes) -> str:
+    doc = Document(io.BytesIO(raw))
+    buf = io.StringIO()  # one growing buffer instead of a list of lines + join
+    w = buf.write
+    for p in doc.paragraphs:
+        t = p.text
+        if t and not t.isspace():
+            w(t.strip())
+            w("\n")
+    for tbl in doc.tables:
+        for row in tbl.rows:
+            sep = ""
+            for c in row.cells:
+                t = c.text.strip()
+                if t:
+                    w(sep)
+                    w(t)
+                    sep = " | "
+            if sep:
+                w("\n")
+    return buf.getvalue().rstrip()
+
+
+# Extracted text by sha256(base64 payload): the same candidate packs get resubmitted a lot
+_RESUME_CACHE: "OrderedDict[str, str]" = OrderedDict()
+# ...and by sha256(raw .docx bytes), shared with the Zoho download path
+_TEXT_POOL: "OrderedDict[bytes, str]" = OrderedDict()
+_RESUME_CACHE_LOCK = threading.Lock()
+_RESUME_CACHE_MAX = 256
+_RESUME_MAX_BYTES = 10 * 1024 * 1024
+_RESUME_MAX_CHARS = 20000
+
+
+def _cap(text: str, max_chars: Optional[int]) -> str:
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    return text[:max_chars] + "\n[...trimmed...]"
+
+
+def prefetch_resume_b64(b64: str, filename: str = "resume.docx", max_chars: Optional[int] = _RESUME_MAX_CHARS, **_) -> str:
     if not b64:
         return "No resume provided."
+    # Cheap rejects first: no hashing/decoding of payloads we'd throw away anyway
+    if not (filename or "").lower().endswith(".docx"):
+        return "Unsupported file type (only .docx)."
+    if len(b64) * 3 // 4 - b64[-2:].count("=") > _RESUME_MAX_BYTES:
+        return "Resume too large (>10MB)."
+    key = hashlib.sha256(b64.encode("ascii", "replace")).hexdigest()
+    with _RESUME_CACHE_LOCK:
+        hit = _RESUME_CACHE.get(key)
+        if hit is not None:
+            _RESUME_CACHE.move_to_end(key)
+            return _cap(hit, max_chars)
+    text = _prefetch_resume_uncached(b64, filename)
+    with _RESUME_CACHE_LOCK:
+        _RESUME_CACHE[key] = text
+        if len(_RESUME_CACHE) > _RESUME_CACHE_MAX:
+            _RESUME_CACHE.popitem(last=False)
+    return _cap(text, max_chars)
+
+
+def _b64decode_strict(b64: str) -> bytes:
+    # one C pass that also validates (3.11+); b64decode(validate=True) regex-scans first
     try:
-        raw = base64.b64decode(b64, validate=True)
+        return binascii.a2b_base64(b64, strict_mode=True)
+    except TypeError:  # no strict_mode on older interpreters
+        return base64.b64decode(b64, validate=True)
+
+
+def _prefetch_resume_uncached(b64: str, filename: str) -> str:
+    try:
+        raw = _b64decode_strict(b64)
     except Exception:
         return "Invalid base64."
-    size_mb = len(raw) / (1024 * 1024)
-    if size_mb > 10.0:
+    return _extract_docx_bytes(raw, filename, max_chars=None)
+
+
+def _extract_docx_bytes(raw: bytes, filename: str, max_chars: Optional[int] = _RESUME_MAX_CHARS) -> str:
+    """Size/type checks + text extraction on raw .docx bytes (no base64 involved). Caches hold untrimmed text."""
+    if len(raw) > _RESUME_MAX_BYTES:
         return "Resume too large (>10MB)."
     if not (filename or "").lower().endswith(".docx"):
         return "Unsupported file type (only .docx)."
+    # Content-addressed: the same file (pasted or pulled from Zoho) maps to one shared str
+    key = hashlib.sha256(raw).digest()
+    with _RESUME_CACHE_LOCK:
+        hit = _TEXT_POOL.get(key)
+        if hit is not None:
+            _TEXT_POOL.move_to_end(key)
+            return _cap(hit, max_chars)
+    text = _docx_to_text(raw)
+    with _RESUME_CACHE_LOCK:
+        text = _TEXT_POOL.setdefault(key, text)
+        if len(_TEXT_POOL) > _RESUME_CACHE_MAX:
+            _TEXT_POOL.popitem(last=False)
+    return _cap(text, max_chars)
+
+
+def _docx_to_text(raw: bytes) -> str:
     try:
-        fileobj = io.BytesIO(raw)
-        doc = Document(fileobj)
-        chunks: List[str] = []
-        for p in doc.paragraphs:
-            t = (p.text or "").strip()
-            if t:
-                chunks.append(t)
-        for tbl in doc.tables:
-            for row in tbl.rows:
-                cells = [c.text.strip() for c in row.cells]
-                line = " | ".join([c for c in cells if c])
-                if line:
-                    chunks.append(line)
-        text = "\n".join(chunks).strip()
+        try:
+            text = _docx_text_xml(raw)
+        except (zipfile.BadZipFile, KeyError) + _XML_ERRORS:
+            # Malformed/unusual package: let python-docx have a go if it's installed
+            if Document is None:
+                raise
+            text = _docx_text_python_docx(raw)
         if not text:
             return "Resume extracted but contains no readable text."
-        return (text[:20000] + "\n[...trimmed...]") if len(text) > 20000 else text
+        return text
     except Exception as e:
         return f"Failed to read .docx: {e}"
 
 
-def shortlist_prefetch(candidates: List[Dict[str, Any]], job_criteria: Dict[str, Any], **_) -> str:
-    """
-    Prepare a standardized, bias-minimized context for LLM shortlisting.
-    Inputs:
-      candidates: [{"name": str, "resume_b64": str, "filename": "x.docx"}, ...]
-      job_criteria: {
-        "title": str (optional),
-        "must_have": [str, ...],
-        "nice_to_have": [str, ...],
-        "min_years_experience": int (optional),
-        "required_qualifications": [str, ...],
-        "location": [str, ...] (optional),
-        "keywords": [str, ...] (optional),
-        "other": str (optional)
-      }
-    Output: Plain text with:
-      - A bias-minimized rubric
-      - The normalized job criteria
-      - Per-candidate packs with extracted resume text (truncated)
-    """
+def _get_str(d: Mapping[str, Any], key: str) -> str:
+    v = d.get(key)
+    if isinstance(v, str):
+        return v.strip()
+    return str(v).strip() if v else ""
+
+
+def _fmt_list(jc: Dict[str, Any], key: str) -> str:
+    vals = jc.get(key) or ()
+    if isinstance(vals, str):
+        vals = (vals,)
+    out: List[str] = []
+    for v in vals:
+        v = str(v).strip()
+        if v:
+            out.append(v)
+    return f"- {key.replace('_',' ').title()}: " + (", ".join(out) if out else "None specified")
+
+
+def _build_header(job_criteria: Dict[str, Any]) -> List[str]:
+    """Rubric + normalized job criteria: everything above the "### Candidates" section."""
     # ---- 1) Bias-minimized scoring rubric (keep consistent across tasks) ----
     rubric = [
         "### Standardized, Bias-Minimized Rubric (0–5 each, integers only)",
@@ -186,110 +485,118 @@ def shortlist_prefetch(candidates: List[Dict[str, Any]], job_criteria: Dict[str,
     ]
 
     # ---- 2) Normalize job criteria ----
-    def _fmt_list(key: str) -> str:
-        vals = job_criteria.get(key) or []
-        if isinstance(vals, str):
-            vals = [vals]
-        vals = [str(v).strip() for v in vals if str(v).strip()]
-        return f"- {key.replace('_',' ').title()}: " + (", ".join(vals) if vals else "None specified")
-
     jc_lines: List[str] = []
-    title = str(job_criteria.get("title") or "").strip()
+    title = _get_str(job_criteria, "title")
     if title:
         jc_lines.append(f"**Role Title**: {title}")
-    jc_lines.append(_fmt_list("must_have"))
-    jc_lines.append(_fmt_list("nice_to_have"))
+    jc_lines.extend((_fmt_list(job_criteria, "must_have"), _fmt_list(job_criteria, "nice_to_have")))
     min_yrs = job_criteria.get("min_years_experience")
     if isinstance(min_yrs, (int, float)):
         jc_lines.append(f"- Minimum Years Experience: {int(min_yrs)}")
-    jc_lines.append(_fmt_list("required_qualifications"))
-    jc_lines.append(_fmt_list("location"))
-    jc_lines.append(_fmt_list("keywords"))
-    other = str(job_criteria.get("other") or "").strip()
+    jc_lines.extend((
+        _fmt_list(job_criteria, "required_qualifications"),
+        _fmt_list(job_criteria, "location"),
+        _fmt_list(job_criteria, "keywords"),
+    ))
+    other = _get_str(job_criteria, "other")
     if other:
         jc_lines.append(f"- Other: {other}")
 
+    return [*rubric, "\n### Job Criteria (Normalized)", "\n".join(jc_lines)]
+
+
+def _iter_pack_lines(idx: int, name: str, extracted: str):
+    # one candidate pack; the two trailing blanks separate packs (the final strip() eats the last ones)
+    yield f"## Candidate {idx}: {name}"
+    yield "ResumeText:"
+    yield extracted
+    yield ""
+    yield ""
+
+
+def shortlist_prefetch(candidates: List[Dict[str, Any]], job_criteria: Dict[str, Any], **_) -> str:
+    """
+    Prepare a standardized, bias-minimized context for LLM shortlisting.
+    Inputs:
+      candidates: [{"name": str, "resume_b64": str, "filename": "x.docx"}, ...]
+      job_criteria: {
+        "title": str (optional),
+        "must_have": [str, ...],
+        "nice_to_have": [str, ...],
+        "min_years_experience": int (optional),
+        "required_qualifications": [str, ...],
+        "location": [str, ...] (optional),
+        "keywords": [str, ...] (optional),
+        "other": str (optional)
+      }
+    Output: Plain text with:
+      - A bias-minimized rubric
+      - The normalized job criteria
+      - Per-candidate packs with extracted resume text (truncated)
+    """
+    header = _build_header(job_criteria)
+
     # ---- 3) Build candidate packs ----
-    packs: List[str] = []
     MAX_PER_RESUME = 12000  # keep LLM cost low
-    for idx, c in enumerate(candidates, 1):
-        name = str(c.get("name") or f"Candidate {idx}").strip()
-        b64 = c.get("resume_b64") or ""
-        fn = c.get("filename") or "resume.docx"
-        extracted = prefetch_resume_b64(b64, fn)
-        if isinstance(extracted, str) and len(extracted) > MAX_PER_RESUME:
-            extracted = extracted[:MAX_PER_RESUME] + "\n[...trimmed for cost...]"
-        packs.append(
-            f"## Candidate {idx}: {name}\n"
-            f"ResumeText:\n{extracted}\n"
-        )
+    # zlib inflate releases the GIL, so a few threads overlap the per-resume unzip work
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(candidates)))) as ex:
+        texts = list(ex.map(
+            lambda c: prefetch_resume_b64(
+                c.get("resume_b64") or "", c.get("filename") or "resume.docx", max_chars=MAX_PER_RESUME
+            ),
+            candidates,
+        ))
 
     # ---- 4) Combine into final context ----
-    out = []
-    out.extend(rubric)
-    out.append("\n### Job Criteria (Normalized)")
-    out.append("\n".join(jc_lines))
-    out.append("\n### Candidates")
-    out.append("\n\n".join(packs))
-    return "\n".join(out).strip()
+    lines = (
+        line
+        for idx, (c, extracted) in enumerate(zip(candidates, texts), 1)
+        for line in _iter_pack_lines(idx, _get_str(c, "name") or f"Candidate {idx}", extracted)
+    )
+    return "\n".join([*header, "\n### Candidates", *lines]).strip()
 
 
 # ---- Optional Zoho Recruit fetchers (Candidates -> Attachments -> download .docx) ----
 # Requires: ZOHO_ACCESS_TOKEN (simple demo) and either ZOHO_RECRUIT_BASE_URL or ZOHO_REGION
 def _zr_base() -> str:
-    # Prefer explicit base URL; accept both keys + a common typo for resilience.
-    override = (
-        os.getenv("ZOHO_RECRUIT_BASE_URL")
-        or os.getenv("ZOHO_RECRUIT_API_BASE")
-        or os.getenv("OHO_RECRUIT_BASE_URL")  # typo-tolerant
-    )
-    if override:
-        return override.rstrip("/")
-
-    # Fallback: region-based host mapping
-    region = (os.getenv("ZOHO_REGION", "eu") or "eu").strip().lower()
-    host = {
-        "eu": "recruit.zoho.eu",
-        "com": "recruit.zoho.com",
-        "in": "recruit.zoho.in",
-        "au": "recruit.zoho.com.au",
-        "jp": "recruit.zoho.jp",
-        "sa": "recruit.zoho.sa",
-        "ca": "recruit.zoho.ca",
-    }.get(region, "recruit.zoho.eu")
-    return f"https://{host}/recruit/v2"
+    return _settings().base_url
 
 
 def _zr_headers() -> dict:
     h = {"Authorization": f"Zoho-oauthtoken {_access_token()}"}
-    org = os.getenv("ZOHO_ORG_ID")
+    org = _settings().org_id
     if org:
         h["X-RECRUIT-ORG"] = org
     return h
 
 def _zr_get(path: str, params: dict | None = None, stream: bool = False):
-    import json as _json
     url = f"{_zr_base()}{path}"
 
-    def _do() -> requests.Response:
-        return requests.get(url, headers=_zr_headers(), params=params, timeout=30, stream=stream)
+    def _do(headers: dict) -> requests.Response:
+        return _SESSION.get(url, headers=headers, params=params, timeout=30, stream=stream)
 
-    r = _do()
+    headers = _zr_headers()
+    r = _do(headers)
     if r.status_code == 401:
         # If refresh flow is configured, try to refresh and retry once
-        if os.getenv("ZOHO_REFRESH_TOKEN") and os.getenv("ZOHO_CLIENT_ID") and os.getenv("ZOHO_CLIENT_SECRET"):
-            # Clear cache and re-acquire
-            _token_cache["token"] = None
-            _token_cache["ts"] = 0
-            _ = _access_token()
-            r = _do()
+        if _settings().can_refresh:
+            # Clear cache (memory + disk) unless a concurrent 401 already replaced the token
+            r.close()
+            _drop_token(stale=headers["Authorization"].split(" ", 1)[1])
+            r = _do(_zr_headers())
 
     if r.status_code >= 400:
-        try:
-            j = r.json()
-            msg = _json.dumps(j)[:300]
-        except Exception:
-            msg = r.text[:300]
+        # Only look at the head of the body: an upstream HTML error page can be huge
+        with r:
+            head = next(r.iter_content(2048), b"") if stream else r.content[:2048]
+        msg = None
+        if (r.headers.get("Content-Type") or "").startswith("application/json"):
+            try:
+                msg = json.dumps(_loads(head))[:300]
+            except ValueError:
+                pass
+        if msg is None:
+            msg = head[:300].decode("utf-8", "replace")
         raise RuntimeError(f"Zoho GET {path} failed {r.status_code}: {msg}")
     return r
 
@@ -297,7 +604,7 @@ def _zr_get(path: str, params: dict | None = None, stream: bool = False):
 def _zr_get_json(path: str, params: dict | None = None) -> dict:
     r = _zr_get(path, params=params, stream=False)
     try:
-        return r.json()
+        return _loads(r.content)
     except Exception:
         return {}
 
@@ -332,53 +639,54 @@ def fetch_resume_text_from_zoho(candidate_id: str) -> str:
     if not att_id:
         return "Attachment id not found."
     # 3) download bytes
+    # stream into a bounded buffer: an oversized attachment is dropped at 10MB, not fully downloaded
+    limit = _RESUME_MAX_BYTES
     r = _zr_get(f"/Candidates/{candidate_id}/Attachments/{att_id}", stream=True)
-    data = r.content
-    if len(data) > 10 * 1024 * 1024:
-        return "Resume too large (>10MB)."
-    # 4) reuse the existing .docx parser by base64-encoding
-    import base64 as _b64
-    return prefetch_resume_b64(_b64.b64encode(data).decode("ascii"), fname)
+    with r:
+        if int(r.headers.get("Content-Length") or 0) > limit:
+            return "Resume too large (>10MB)."
+        buf = bytearray()
+        for chunk in r.iter_content(chunk_size=65536):
+            buf += chunk
+            if len(buf) > limit:
+                return "Resume too large (>10MB)."
+    data = bytes(buf)
+    # 4) parse the downloaded bytes directly
+    return _extract_docx_bytes(data, fname)
+
+def _fetch_candidate(idx: int, cid: str) -> Dict[str, Any]:
+    # try to get candidate name (best-effort)
+    name = f"Candidate {idx}"
+    try:
+        rec = _zr_get_json(f"/Candidates/{cid}")  # single record
+        data = rec.get("data") or []
+        if isinstance(data, list) and data:
+            row = data[0]
+            first = _get_str(row, "First_Name")
+            last = _get_str(row, "Last_Name")
+            nm = f"{first} {last}".strip() or row.get("Email") or name
+            name = nm
+    except Exception:
+        pass
+    return {"name": name, "extracted": fetch_resume_text_from_zoho(cid)}
+
 
 def shortlist_prefetch_from_zoho(candidate_ids: List[str], job_criteria: Dict[str, Any], **_) -> str:
     """
     Build the same shortlist context as shortlist_prefetch, but fetch resumes by Candidate IDs.
     """
-    candidates: List[Dict[str, Any]] = []
-    for idx, cid in enumerate(candidate_ids, 1):
-        # try to get candidate name (best-effort)
-        name = f"Candidate {idx}"
-        try:
-            rec = _zr_get_json(f"/Candidates/{cid}")  # single record
-            data = rec.get("data") or []
-            if isinstance(data, list) and data:
-                row = data[0]
-                first = (row.get("First_Name") or "").strip()
-                last = (row.get("Last_Name") or "").strip()
-                nm = f"{first} {last}".strip() or row.get("Email") or name
-                name = nm
-        except Exception:
-            pass
-        extracted = fetch_resume_text_from_zoho(cid)
-        candidates.append({"name": name, "resume_b64": "", "filename": "from_zoho.docx", "extracted": extracted})
-
-    # Convert 'extracted' to the expected format by shortlist_prefetch
-    # (it calls prefetch_resume_b64 internally, so we pass the text directly)
-    # We'll adapt: if 'extracted' already plain text, use as-is.
-    # Rebuild packs using the same shape:
-    rubric_context = shortlist_prefetch(
-        candidates=[{"name": c["name"], "resume_b64": "", "filename": "from_zoho.docx"} for c in candidates],
-        job_criteria=job_criteria
+    # Each candidate's record GET + attachment list + download run on one worker; candidates
+    # fan out across the pool (pooled Session, so connections are shared).
+    with ThreadPoolExecutor(max_workers=max(1, min(16, len(candidate_ids)))) as ex:
+        candidates = list(ex.map(_fetch_candidate, range(1, len(candidate_ids) + 1), candidate_ids))
+
+    # Same header as shortlist_prefetch, with the already-extracted text as each pack
+    lines = (
+        line
+        for idx, c in enumerate(candidates, 1)
+        for line in _iter_pack_lines(idx, c["name"], c["extracted"])
     )
-    # Replace the auto-extracted placeholder with our fetched text
-    # (quick substitution—each "Candidate N: Name\nResumeText:\n" anchor is unique enough for demo use)
-    out_lines = rubric_context.split("### Candidates", 1)
-    head = out_lines[0]
-    body = out_lines[1] if len(out_lines) > 1 else ""
-    built = ["### Candidates"]
-    for idx, c in enumerate(candidates, 1):
-        built.append(f"\n## Candidate {idx}: {c['name']}\nResumeText:\n{c['extracted']}\n")
-    return (head + "\n" + "\n".join(built)).strip()
+    return "\n".join([*_build_header(job_criteria), "\n\n### Candidates", "", *lines]).strip()
 
 def resume_summarize_prefetch_from_zoho(candidate_id: str, **_) -> str:
     """
@@ -8,17 +8,42 @@
 # - Prefetch errors are caught and returned as readable errors (no silent 500s)
 
 import os
+import re
+import json
+import asyncio
+import math
 import time
+import functools
+import hashlib
 import importlib
-from typing import Any, Dict, Optional, Callable
+import threading
+from binascii import a2b_base64
+from collections import OrderedDict, deque, namedtuple
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional
 
 import httpx
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 import yaml
+try:
+    from yaml import CSafeLoader as _YamlLoader  # libyaml C parser when PyYAML was built with it
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+try:
+    import orjson  # optional: faster JSON (de)serialization
+    _json_loads = orjson.loads
+    _json_dumpb = orjson.dumps
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+    def _json_dumpb(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
 
 from googleapiclient.errors import HttpError
-from api.integrations.google_ws import gmail_fetch_newest_thread, gmail_create_draft_reply, gdocs_create_from_text
+from api.integrations.google_ws import gmail_fetch_newest_thread, gdocs_create_from_text
 
 from api.integrations.pipedrive import (
     stalled_deals_report,
@@ -32,40 +57,58 @@ from api.integrations.pipedrive import (
 # ---- Model registry + cost-aware selection (reads config/price_table.yaml) ----
 PRICE_TABLE_PATH = os.getenv("PRICE_TABLE_PATH") or "config/price_table.yaml"
 
-def _load_price_table() -> dict:
-    try:
-        with open(PRICE_TABLE_PATH, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f) or {}
-    except FileNotFoundError:
-        return {"models": [], "policy": {"cache_seconds": 0, "retry": {"max_attempts": 2, "initial_backoff_ms": 400, "multiplier": 2.0}}}
+_FALLBACK_PRICE_TABLE = {"models": [], "policy": {"cache_seconds": 0, "retry": {"max_attempts": 2, "initial_backoff_ms": 400, "multiplier": 2.0}}}
 
-_PRICE_TABLE = _load_price_table()
-_MODELS = _PRICE_TABLE.get("models", [])
-_POLICY = _PRICE_TABLE.get("policy", {}) or {}
+# Env vars that unlock each hosted provider (any one is enough)
+_KEY_ENV: Dict[str, tuple] = {
+    "openai": ("OPENAI_API_KEY",),
+    "anthropic": ("ANTHROPIC_API_KEY",),
+    "mistral": ("MISTRAL_API_KEY",),
+    "google": ("GOOGLE_API_KEY", "GOOGLE_GENAI_API_KEY", "GEMINI_API_KEY"),
+}
 
-def _has_key_for(provider: str) -> bool:
-    if provider == "openai":
-        return bool(os.getenv("OPENAI_API_KEY"))
-    if provider == "anthropic":
-        return bool(os.getenv("ANTHROPIC_API_KEY"))
-    if provider == "mistral":
-        return bool(os.getenv("MISTRAL_API_KEY"))
-    if provider == "google":
-        return bool(
-            os.getenv("GOOGLE_API_KEY")
-            or os.getenv("GOOGLE_GENAI_API_KEY")
-            or os.getenv("GEMINI_API_KEY")
+# Pre-parsed price table row; `row` is the original YAML dict (what callers get back)
+ModelRow = namedtuple("ModelRow", "provider model quality pi po row")
+PriceTable = namedtuple("PriceTable", "models policy rows")
+
+def _load_price_table(path: str = PRICE_TABLE_PATH) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return yaml.load(f, Loader=_YamlLoader) or {}
+    except FileNotFoundError:
+        return _FALLBACK_PRICE_TABLE
+
+@functools.lru_cache(maxsize=1)
+def _price_table_snapshot(path: str, mtime: Optional[float]) -> PriceTable:
+    """Parsed once per (path, mtime): editing the YAML is picked up without a restart."""
+    table = _load_price_table(path)
+    models = table.get("models", []) or []
+    rows = tuple(
+        ModelRow(
+            m.get("provider"),
+            m.get("model"),
+            int(m.get("baseline_quality", 1)),
+            float(m.get("price_in_per_1k", 0.0)),
+            float(m.get("price_out_per_1k", 0.0)),
+            m,
         )
-    return False
+        for m in models
+    )
+    return PriceTable(models, table.get("policy", {}) or {}, rows)
 
-def _chars_to_tokens(chars: int) -> int:
-    # cheap heuristic; safe enough for budgeting (≈ 4 chars/token)
-    return max(1, int(chars / 4))
+def _price_table_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(PRICE_TABLE_PATH)
+    except OSError:
+        return None
 
-def _estimate_tokens(prompt: str, expected_out_tokens: int) -> tuple[int,int]:
-    ptoks = _chars_to_tokens(len(prompt))
-    otoks = max(1, int(expected_out_tokens))
-    return ptoks, otoks
+def _price_table() -> PriceTable:
+    return _price_table_snapshot(PRICE_TABLE_PATH, _price_table_mtime())
+
+@functools.lru_cache(maxsize=16)
+def _has_key_for(provider: str) -> bool:
+    # env is fixed for the life of the process
+    return any(os.getenv(k) for k in _KEY_ENV.get(provider, ()))
 
 def _estimate_cost(model_row: dict, in_tokens: int, out_tokens: int) -> float:
     pi = float(model_row.get("price_in_per_1k", 0.0))
@@ -78,47 +121,60 @@ def _pick_model_by_policy(prompt: str, expected_out_tokens: int, quality_floor:
     Always keep local (ollama) options in play (free).
     Return the selected model row (dict). Callers decide which caller shim to use.
     """
-    in_toks, out_toks = _estimate_tokens(prompt, expected_out_tokens)
-
-    # step 1: gather viable models (quality >= floor and has key if hosted)
-    viable = []
-    for m in _MODELS:
-        q = int(m.get("baseline_quality", 1))
-        if q < quality_floor:
+    return _pick_model_and_cost(prompt, expected_out_tokens, quality_floor)[0]
+
+def _pick_model_and_cost(prompt: str, expected_out_tokens: int, quality_floor: int) -> tuple[dict, float]:
+    """Same pick plus its estimated cost (what _estimate_cost would return for it)."""
+    # cheap heuristic, safe enough for budgeting (≈ 4 chars/token).
+    # The pick only depends on these + the table, so it's memoized on them.
+    in_toks = (len(prompt) >> 2) or 1
+    out_toks = max(1, int(expected_out_tokens))
+    return _pick_model_cached(_price_table_mtime(), in_toks, out_toks, quality_floor)
+
+@functools.lru_cache(maxsize=128)
+def _pick_model_cached(mtime: Optional[float], in_toks: int, out_toks: int, quality_floor: int) -> tuple[dict, float]:
+    # mtime in the key: a YAML edit gets a fresh snapshot and fresh picks
+    in_frac = in_toks / 1000.0
+    out_frac = out_toks / 1000.0
+
+    rows = _price_table_snapshot(PRICE_TABLE_PATH, mtime).rows
+
+    # step 1: cheapest viable model (quality >= floor and has key if hosted), single pass.
+    # Strict '<' keeps the first of equal-cost rows, same as the stable sort did.
+    best_cost, best_row = math.inf, None
+    first_ollama = None  # fallback below, collected in the same pass
+    for r in rows:
+        if first_ollama is None and r.provider == "ollama":
+            first_ollama = r.row
+        if r.quality < quality_floor:
             continue
-        if m.get("provider") != "ollama" and not _has_key_for(m.get("provider")):
+        if r.provider != "ollama" and not _has_key_for(r.provider):
             continue
-        # annotate with estimated cost now
-        est = _estimate_cost(m, in_toks, out_toks)
-        viable.append((est, m))
-    # choose the cheapest viable option by estimated cost
-    if viable:
-        viable.sort(key=lambda x: x[0])
-        return viable[0][1]
-
+        est = in_frac*r.pi + out_frac*r.po
+        if est < best_cost:
+            best_cost, best_row = est, r.row
+    if best_row is not None:
+        return best_row, best_cost
 
     # if nothing viable (e.g., floor too high), fall back to ANY local
-    if not viable:
-        # If there exist hosted models that meet the floor but keys are missing, surface a clear error
-        hosted_needing_keys = [
-            m for m in _MODELS
-            if m.get("provider") != "ollama"
-            and int(m.get("baseline_quality", 1)) >= quality_floor
-            and not _has_key_for(m.get("provider"))
-        ]
-        if hosted_needing_keys:
-            providers_missing = sorted({m["provider"] for m in hosted_needing_keys})
-            raise HTTPException(
-                status_code=400,
-                detail=f"No API key for provider(s): {', '.join(providers_missing)}; cannot meet quality_floor={quality_floor}"
-            )
+    # If there exist hosted models that meet the floor but keys are missing, surface a clear error
+    hosted_needing_keys = [
+        r for r in rows
+        if r.provider != "ollama"
+        and r.quality >= quality_floor
+        and not _has_key_for(r.provider)
+    ]
+    if hosted_needing_keys:
+        providers_missing = sorted({r.provider for r in hosted_needing_keys})
+        raise HTTPException(
+            status_code=400,
+            detail=f"No API key for provider(s): {', '.join(providers_missing)}; cannot meet quality_floor={quality_floor}"
+        )
 
-        # else really nothing meets the floor → fall back to ANY local
-        fallbacks = [m for m in _MODELS if m.get("provider") == "ollama"]
-        if fallbacks:
-            return fallbacks[0]
-        # last ditch: return a tiny local default
-        return {"provider": "ollama", "model": "tinyllama", "baseline_quality": 2}
+    # else really nothing meets the floor → fall back to ANY local
+    # last ditch: a tiny local default
+    row = first_ollama or {"provider": "ollama", "model": "tinyllama", "baseline_quality": 2}
+    return row, _estimate_cost(row, in_toks, out_toks)
 
 
 # ---- Google model discovery (cache) + Google caller ----
@@ -317,22 +373,33 @@ def _redact(s: str) -> str:
 
 
 # ---- Debug helper for Gmail shapes (enabled when DEBUG_GMAIL=1) ----
-def _gmail_debug_shape(tag: str, data: Any) -> None:
-    if os.getenv("DEBUG_GMAIL", "0") != "1":
+# read once at import; when off the helper is an empty function
+_DEBUG_GMAIL = os.getenv("DEBUG_GMAIL", "0") == "1"
+
+if _DEBUG_GMAIL:
+    def _gmail_debug_shape(tag: str, data: Any) -> None:
+        try:
+            def skim(x, depth=0):
+                if depth > 2:  # avoid huge dumps
+                    return type(x).__name__
+                if isinstance(x, dict):
+                    return {k: skim(v, depth+1) for k, v in list(x.items())[:10]}
+                if isinstance(x, list):
+                    return [skim(v, depth+1) for v in x[:5]]
+                if isinstance(x, str):
+                    return x[:1200]  # only 1200 chars get printed anyway; don't serialize whole bodies
+                return x if isinstance(x, (int, float, bool)) else type(x).__name__
+            if orjson is not None:
+                dumped = orjson.dumps(skim(data), option=orjson.OPT_NON_STR_KEYS).decode()
+            else:
+                import json
+                dumped = json.dumps(skim(data))
+            print(f"[GMAIL-DEBUG] {tag}: {dumped[:1200]}")
+        except Exception:
+            pass
+else:
+    def _gmail_debug_shape(tag: str, data: Any) -> None:
         return
-    try:
-        import json
-        def skim(x, depth=0):
-            if depth > 2:  # avoid huge dumps
-                return type(x).__name__
-            if isinstance(x, dict):
-                return {k: skim(v, depth+1) for k, v in list(x.items())[:10]}
-            if isinstance(x, list):
-                return [skim(v, depth+1) for v in x[:5]]
-            return x if isinstance(x, (str, int, float, bool)) else type(x).__name__
-        print(f"[GMAIL-DEBUG] {tag}: {json.dumps(skim(data))[:1200]}")
-    except Exception:
-        pass
 
 def _extract_email(addr: str) -> str:
     """Return the email address from 'Name <email@x>' or raw email if no angle brackets."""
@@ -347,128 +414,6 @@ def _extract_email(addr: str) -> str:
     return s
 
 
-def _gmail_create_draft_flexible(
-    body_text: str,
-    *,
-    to: str | list[str] | None = None,
-    subject: str | None = None,
-    thread_id: str | None = None,
-    in_reply_to_msgid: str | None = None,
-    refs: str | list[str] | None = None,
-):
-    """
-    Try many signatures for gmail_create_draft_reply; if not compatible, try gmail_create_draft.
-    Accepts recipient as str or list; returns a string draft id.
-    """
-    last_err = None
-
-    # normalize recipients
-    to_list: list[str] | None = None
-    if isinstance(to, str) and to.strip():
-        to_list = [_extract_email(to)]
-    elif isinstance(to, list) and to:
-        to_list = [_extract_email(t) for t in to if t and str(t).strip()]
-
-    def _normalize_return(x):
-        if isinstance(x, str) and x.strip():
-            return x.strip()
-        if isinstance(x, dict):
-            return x.get("draft_id") or x.get("id") or x.get("draftId") or x.get("messageId")
-        return None
-
-    # --- 1) Try gmail_create_draft_reply with many kwarg/positional forms ---
-    try:
-        # ID-based reply (best when thread exists)
-        if thread_id or in_reply_to_msgid:
-            for kw in (
-                {"thread_id": thread_id, "subject": subject, "body_text": body_text, "refs": refs},
-                {"in_reply_to_msgid": in_reply_to_msgid, "subject": subject, "body_text": body_text, "refs": refs},
-                {"thread_id": thread_id, "subject": subject, "body": body_text, "refs": refs},
-                {"in_reply_to_msgid": in_reply_to_msgid, "subject": subject, "body": body_text, "refs": refs},
-            ):
-                kw = {k: v for k, v in kw.items() if v}
-                if kw:
-                    try:
-                        rid = _normalize_return(gmail_create_draft_reply(**kw))
-                        if rid:
-                            return rid
-                    except Exception as e:
-                        last_err = e
-
-        # Recipient-based (no thread ids)
-        if to_list:
-            for kw in (
-                {"to": to_list[0], "subject": subject, "body_text": body_text},
-                {"recipient": to_list[0], "subject": subject, "body_text": body_text},
-                {"to_email": to_list[0], "subject": subject, "body_text": body_text},
-                {"to_addrs": to_list, "subject": subject, "body_text": body_text},
-                {"to": to_list[0], "subject": subject, "body": body_text},
-                {"recipient": to_list[0], "subject": subject, "body": body_text},
-                {"to_email": to_list[0], "subject": subject, "body": body_text},
-                {"to_addrs": to_list, "subject": subject, "body": body_text},
-            ):
-                try:
-                    rid = _normalize_return(gmail_create_draft_reply(**kw))
-                    if rid:
-                        return rid
-                except Exception as e:
-                    last_err = e
-
-        # Some helpers accept positional (subject, body)
-        if subject:
-            try:
-                rid = _normalize_return(gmail_create_draft_reply(subject, body_text))  # positional
-                if rid:
-                    return rid
-            except Exception as e:
-                last_err = e
-    except Exception as e:
-        last_err = e
-
-    # --- 2) Try a different function name if present: gmail_create_draft ---
-    try:
-        # import here to avoid failing earlier if function is absent
-        from api.integrations.google_ws import gmail_create_draft  # type: ignore
-        # recipient-based
-        if to_list:
-            for kw in (
-                {"to": to_list[0], "subject": subject, "body_text": body_text},
-                {"recipient": to_list[0], "subject": subject, "body_text": body_text},
-                {"to_email": to_list[0], "subject": subject, "body_text": body_text},
-                {"to_addrs": to_list, "subject": subject, "body_text": body_text},
-                {"to": to_list[0], "subject": subject, "body": body_text},
-                {"recipient": to_list[0], "subject": subject, "body": body_text},
-                {"to_email": to_list[0], "subject": subject, "body": body_text},
-                {"to_addrs": to_list, "subject": subject, "body": body_text},
-            ):
-                try:
-                    rid = _normalize_return(gmail_create_draft(**kw))
-                    if rid:
-                        return rid
-                except Exception as e:
-                    last_err = e
-        # positional variants
-        if subject and to_list:
-            try:
-                rid = _normalize_return(gmail_create_draft(to_list[0], subject, body_text))
-                if rid:
-                    return rid
-            except Exception as e:
-                last_err = e
-        if subject:
-            try:
-                rid = _normalize_return(gmail_create_draft(subject, body_text))
-                if rid:
-                    return rid
-            except Exception as e:
-                last_err = e
-    except Exception as e:
-        # module may not provide gmail_create_draft; ignore
-        last_err = e
-
-    raise RuntimeError(f"gmail_create_draft(_reply) not compatible with known signatures; last error: {last_err}")
-
-
 # ---- Gmail adapters (signature- & shape-tolerant) ----
 def _gmail_fetch_newest_thread_flexible(n_threads: int = 1, lookback_days: int = 14):
     """
@@ -515,131 +460,25 @@ def _gmail_fetch_newest_thread_flexible(n_threads: int = 1, lookback_days: int =
     raise RuntimeError(f"gmail_fetch_newest_thread() incompatible with tried signatures; last error: {last_exc}")
 
 
-def _gmail_pick_last_message(data: dict | list | str) -> dict:
-    """
-    Pick the newest/last message from many possible shapes returned by gmail_fetch_newest_thread.
-    Returns: {from, subject, message_id, thread_id, references}
-    Strategy:
-      0) If `data` is a pre-rendered string (like g.gmail_summarize output), parse the last item.
-      1) Try known containers (threads[0].messages, messages, items, data).
-      2) If empty, recursively deep-scan for a plausible "message-like" dict with headers.
-      3) Extract From/Subject/Message-Id/ThreadId from payload.headers or known keys.
-    """
-    # 0) Handle pre-rendered string format (e.g., lines like "[1] From: ... | Subject: ... | Date: ...")
-    if isinstance(data, str):
-        import re
-        lines = [ln.strip() for ln in data.splitlines() if ln.strip()]
-        cand = None
-        for ln in reversed(lines):
-            if re.match(r"^\[\d+\]\s+From:", ln):
-                cand = ln
-                break
-        if cand:
-            parts = [p.strip() for p in cand.split("|")]
-            frm, subj = "", ""
-            for p in parts:
-                if p.lower().startswith("from:"):
-                    frm = p.split(":", 1)[1].strip()
-                elif p.lower().startswith("subject:"):
-                    subj = p.split(":", 1)[1].strip()
-            return {"from": frm, "subject": subj, "message_id": "", "thread_id": "", "references": None}
-        # fall through to generic logic if we couldn't parse the string
-
-    def _as_list(x):
-        return x if isinstance(x, list) else []
-
-    def _pull_headers(obj: dict) -> list:
-        if isinstance(obj.get("payload"), dict) and isinstance(obj["payload"].get("headers"), list):
-            return obj["payload"]["headers"]
-        if isinstance(obj.get("headers"), list):
-            return obj["headers"]
-        return []
-
-    def _header(headers: list, name: str) -> Optional[str]:
-        low = name.lower()
-        for h in headers:
-            try:
-                if str(h.get("name", "")).lower() == low:
-                    return h.get("value")
-            except Exception:
-                continue
-        return None
+def _ap_msg_lines(ap, i, frm, subj, date, snippet, body) -> int:
+    """Append one message's digest lines via ap; returns the chars added (incl. joins)."""
+    head = f"[{i}] From: {frm} | Subject: {subj} | Date: {date}"
+    ap(head)
+    n = len(head) + 1
+    if snippet:
+        line = f"Preview: {snippet}"
+        ap(line)
+        n += len(line) + 1
+    if body:
+        line = "---\n" + (body[:1500] if len(body) > 1500 else body)
+        ap(line)
+        n += len(line) + 1
+    return n
 
-    def _extract_msg(msg: dict) -> dict:
-        headers = _pull_headers(msg)
-        sender = msg.get("from") or (headers and _header(headers, "From")) or ""
-        subject = msg.get("subject") or (headers and _header(headers, "Subject")) or ""
-        msg_id = msg.get("message_id") or msg.get("id") or (headers and _header(headers, "Message-Id")) or ""
-        thread_id = msg.get("thread_id") or msg.get("threadId") or ""
-        refs = msg.get("references") or (headers and (_header(headers, "References") or _header(headers, "In-Reply-To"))) or None
-        return {
-            "from": sender or "",
-            "subject": subject or "",
-            "message_id": msg_id or "",
-            "thread_id": thread_id or "",
-            "references": refs,
-        }
 
-    # 1) “straight” shapes
-    msgs = []
-    if isinstance(data, dict):
-        threads = _as_list(data.get("threads") or data.get("items") or data.get("data"))
-        if threads:
-            t0 = threads[0]
-            msgs = _as_list(
-                t0.get("messages")
-                or t0.get("msgs")
-                or (t0.get("message") if isinstance(t0.get("message"), list) else [])
-                or (t0.get("payloads") if isinstance(t0.get("payloads"), list) else [])
-            )
-        if not msgs:
-            msgs = _as_list(data.get("messages") or data.get("items") or data.get("data"))
-    elif isinstance(data, list):
-        msgs = _as_list(data)
-
-    if msgs:
-        last = msgs[-1]
-        out = _extract_msg(last) if isinstance(last, dict) else {
-            "from": "", "subject": "", "message_id": "", "thread_id": "", "references": None
-        }
-        _gmail_debug_shape("pick_last straight", out)
-        return out
-
-    # 2) deep scan for any message-like dict (payload.headers present or suggestive keys)
-    found: Optional[dict] = None
-
-    def _looks_like_message(obj: Any) -> bool:
-        if not isinstance(obj, dict):
-            return False
-        if "payload" in obj and isinstance(obj.get("payload"), dict) and isinstance(obj["payload"].get("headers"), list):
-            return True
-        if any(k in obj for k in ("from", "subject", "message_id", "id", "thread_id", "threadId", "headers")):
-            return True
-        return False
-
-    def _scan(x: Any):
-        nonlocal found
-        if found is not None:
-            return
-        if isinstance(x, dict):
-            if _looks_like_message(x):
-                found = x
-                return
-            for v in x.values():
-                _scan(v)
-        elif isinstance(x, list):
-            for v in x:
-                _scan(v)
-
-    _scan(data)
-    if found:
-        out = _extract_msg(found)
-        _gmail_debug_shape("pick_last deep", out)
-        return out
-
-    # 3) give up
-    _gmail_debug_shape("pick_last empty", data)
-    return {"from": "", "subject": "", "message_id": "", "thread_id": "", "references": None}
+def _full(lines: list[str], max_chars: int) -> bool:
+    # stripped text already longer than max_chars -> the rest can only be trimmed away
+    return len("\n".join(lines).strip()) > max_chars
 
 
 def _gmail_thread_to_text(data: Any, max_chars: int = 4000) -> str:
@@ -664,6 +503,8 @@ def _gmail_thread_to_text(data: Any, max_chars: int = 4000) -> str:
             return default
 
     lines: list[str] = []
+    _ap = lines.append
+    size = 0  # running length of "\n".join(lines); lets us stop once past max_chars
 
     # Common dict shape: {"threads":[{"messages":[{message}] }]}
     if isinstance(data, dict):
@@ -686,11 +527,9 @@ def _gmail_thread_to_text(data: Any, max_chars: int = 4000) -> str:
                 date = (m.get("date") if isinstance(m, dict) else "") or ""
                 snippet = (m.get("snippet") if isinstance(m, dict) else "") or ""
                 body = (m.get("text") if isinstance(m, dict) else "") or ""
-                lines.append(f"[{i}] From: {frm} | Subject: {subj} | Date: {date}")
-                if snippet:
-                    lines.append(f"Preview: {snippet}")
-                if body:
-                    lines.append(f"---\n{body[:1500]}")
+                size += _ap_msg_lines(_ap, i, frm, subj, date, snippet, body)
+                if size > max_chars and _full(lines, max_chars):
+                    break
         else:
             # Fallback: stringify compactly
             import json
@@ -705,13 +544,13 @@ def _gmail_thread_to_text(data: Any, max_chars: int = 4000) -> str:
                 date = m.get("date", "")
                 snippet = m.get("snippet", "")
                 body = m.get("text", "")
-                lines.append(f"[{i}] From: {frm} | Subject: {subj} | Date: {date}")
-                if snippet:
-                    lines.append(f"Preview: {snippet}")
-                if body:
-                    lines.append(f"---\n{body[:1500]}")
+                size += _ap_msg_lines(_ap, i, frm, subj, date, snippet, body)
             else:
-                lines.append(str(m))
+                s = str(m)
+                _ap(s)
+                size += len(s) + 1
+            if size > max_chars and _full(lines, max_chars):
+                break
 
     else:
         # Unknown shape—stringify
@@ -722,62 +561,85 @@ def _gmail_thread_to_text(data: Any, max_chars: int = 4000) -> str:
 
 
 # ---- Direct Gmail API helpers (bypass unknown helper signatures) ----
-def _gmail_build_service_from_token():
-    """
-    Build a Gmail service using the existing token JSON. Only reads the file.
-    """
+_GMAIL_SCOPES = (
+    "https://www.googleapis.com/auth/gmail.compose",
+    "https://www.googleapis.com/auth/gmail.modify",
+)
+# discovery clients are per thread (httplib2.Http isn't thread-safe), creds are shared
+_GMAIL_SVC_LOCAL = threading.local()
+
+
+@functools.lru_cache(maxsize=4)
+def _gmail_creds_cached(token_path: str, mtime_ns: int):
     from google.oauth2.credentials import Credentials
+    return Credentials.from_authorized_user_file(token_path, scopes=list(_GMAIL_SCOPES))
+
+
+def _gmail_drop_service_on_401(e: Exception) -> None:
+    if getattr(getattr(e, "resp", None), "status", None) == 401:
+        # new creds object -> every thread's cached client gets rebuilt on next use
+        _gmail_creds_cached.cache_clear()
+
+
+def _gmail_creds():
+    """Cached creds for the token JSON (re-read when the file's mtime changes), refreshed in place."""
     from google.auth.transport.requests import Request
-    from googleapiclient.discovery import build
 
     token_path = os.getenv("GOOGLE_TOKEN_PATH") or os.getenv("GOOGLE_OAUTH_TOKEN_JSON")
     if not token_path:
         raise RuntimeError("GOOGLE_TOKEN_PATH not set")
 
-    scopes = [
-        "https://www.googleapis.com/auth/gmail.compose",
-        "https://www.googleapis.com/auth/gmail.modify",
-    ]
-    creds = Credentials.from_authorized_user_file(token_path, scopes=scopes)
+    creds = _gmail_creds_cached(token_path, os.stat(token_path).st_mtime_ns)
     if creds and creds.expired and creds.refresh_token:
-        # refresh happens in-memory; no write to disk
+        # refresh happens in-memory on the cached object; no write to disk
         creds.refresh(Request())
-
-    return build("gmail", "v1", credentials=creds, cache_discovery=False)
+    return creds
 
 
-def _gmail_create_draft_via_api(
-    *,
-    to: str,
-    subject: str,
-    body_text: str,
-    thread_id: str | None = None,
-    in_reply_to_msgid: str | None = None,
-    refs: str | list[str] | None = None,
-) -> str:
+def _gmail_build_service_from_token():
     """
-    Create a Gmail draft directly via Gmail API. Returns draft id.
+    Build a Gmail service using the existing token JSON. Only reads the file.
+    Reused until the token file changes (mtime) or Gmail answers 401.
     """
-    from email.mime.text import MIMEText
-    import base64
+    from googleapiclient.discovery import build
 
-    svc = _gmail_build_service_from_token()
+    creds = _gmail_creds()
+    hit = getattr(_GMAIL_SVC_LOCAL, "svc", None)
+    if hit is None or hit[0] is not creds:
+        hit = _GMAIL_SVC_LOCAL.svc = (creds, build("gmail", "v1", credentials=creds, cache_discovery=False))
+    return hit[1]
+
+
+# Gmail bodies are unpadded urlsafe base64; translate + a2b_base64 skips base64.py's wrappers
+_URLSAFE_TRANS = bytes.maketrans(b"-_", b"+/")
 
-    msg = MIMEText(body_text, "plain", "utf-8")
-    msg["To"] = to
-    msg["Subject"] = subject
-    if in_reply_to_msgid:
-        msg["In-Reply-To"] = in_reply_to_msgid
-    if refs:
-        msg["References"] = refs if isinstance(refs, str) else " ".join(refs)
 
-    raw = base64.urlsafe_b64encode(msg.as_bytes()).decode("utf-8")
-    payload = {"message": {"raw": raw}}
-    if thread_id:
-        payload["message"]["threadId"] = thread_id
+def _walk_parts(root: Any) -> str:
+    """First non-empty text/plain body in a Gmail payload tree (depth-first, iterative)."""
+    stack = deque([root])
+    while stack:
+        p = stack.pop()
+        if not p:
+            continue
+        mime = p.get("mimeType","")
+        data = (p.get("body") or {}).get("data")
+        if data and ("text/plain" in mime or not mime):
+            try:
+                raw = a2b_base64(data.encode("ascii").translate(_URLSAFE_TRANS) + b"=" * (-len(data) % 4))
+                txt = raw.decode("utf-8", errors="ignore")
+            except Exception:
+                txt = ""
+            if txt:
+                return txt
+            continue
+        stack.extend(reversed(p.get("parts") or ()))
+    return ""
+
 
-    draft = svc.users().drafts().create(userId="me", body=payload).execute()
-    return draft.get("id") or draft.get("draft", {}).get("id") or ""
+_WANTED_HEADERS = frozenset(("From", "Subject", "Date"))
+
+# Gmail recommends keeping batches at <= 50 calls to avoid per-user rate limiting
+_GMAIL_BATCH_MAX = 50
 
 
 def _gmail_fetch_newest_thread_direct(n_threads: int = 1, lookback_days: int = 14) -> dict:
@@ -790,48 +652,65 @@ def _gmail_fetch_newest_thread_direct(n_threads: int = 1, lookback_days: int = 1
 
     # Safe default query: last X days, inbox only, skip promotions to keep noise low
     q = f"newer_than:{int(lookback_days)}d -category:promotions"
-    res = svc.users().messages().list(userId="me", q=q, labelIds=["INBOX"], maxResults=max(1, n_threads)).execute()
+    try:
+        res = svc.users().messages().list(userId="me", q=q, labelIds=["INBOX"], maxResults=max(1, n_threads)).execute()
+    except HttpError as e:
+        _gmail_drop_service_on_401(e)
+        raise
     msg_list = res.get("messages", [])
     if not msg_list:
         return {"threads": []}
 
-    threads_out = []
+    # messages.list already carries threadId; only fall back to messages.get when it doesn't
+    thread_ids = []
     for msg_meta in msg_list[:n_threads]:
-        # Get the full message to learn the threadId
-        full_msg = svc.users().messages().get(userId="me", id=msg_meta["id"], format="full").execute()
-        thread_id = full_msg.get("threadId")
+        thread_id = msg_meta.get("threadId")
         if not thread_id:
-            continue
+            thread_id = svc.users().messages().get(userId="me", id=msg_meta["id"], format="minimal").execute().get("threadId")
+        if thread_id:
+            thread_ids.append(thread_id)
 
-        # Pull the whole thread
-        th = svc.users().threads().get(userId="me", id=thread_id, format="full").execute()
+    # Pull the whole threads in one multipart /batch round-trip (<= 50 calls per batch)
+    got: Dict[str, dict] = {}
+    errs: list = []
+
+    def _cb(request_id, response, exception):
+        if exception is None:
+            got[request_id] = response
+        else:
+            errs.append(exception)
+
+    uniq = list(dict.fromkeys(thread_ids))
+    for off in range(0, len(uniq), _GMAIL_BATCH_MAX):
+        batch = svc.new_batch_http_request(callback=_cb)
+        for tid in uniq[off:off + _GMAIL_BATCH_MAX]:
+            batch.add(svc.users().threads().get(userId="me", id=tid, format="full"), request_id=tid)
+        batch.execute()
+    if errs:
+        _gmail_drop_service_on_401(errs[0])
+        raise errs[0]
+
+    threads_out = []
+    for thread_id in thread_ids:
+        th = got.get(thread_id) or {}
         msgs_norm = []
 
         for m in th.get("messages", []):
-            # Extract headers we need
-            hdrs = {h.get("name",""): h.get("value","") for h in (m.get("payload",{}) or {}).get("headers", [])}
-            frm = hdrs.get("From", "")
-            subj = hdrs.get("Subject", "")
-            date = hdrs.get("Date", "")
+            # Extract headers we need (one pass, no full dict; last one wins like before)
+            frm = subj = date = ""
+            for h in (m.get("payload",{}) or {}).get("headers", []):
+                n = h.get("name","")
+                if n in _WANTED_HEADERS:
+                    v = h.get("value","")
+                    if n == "From":
+                        frm = v
+                    elif n == "Subject":
+                        subj = v
+                    else:
+                        date = v
             snippet = m.get("snippet", "")
 
             # Extract plain text body (best-effort)
-            def _walk_parts(p):
-                if not p: return ""
-                mime = p.get("mimeType","")
-                body = p.get("body", {})
-                data = body.get("data")
-                if data and ("text/plain" in mime or (not mime and data)):
-                    import base64
-                    try:
-                        return base64.urlsafe_b64decode(data.encode("utf-8")).decode("utf-8", errors="ignore")
-                    except Exception:
-                        return ""
-                for ch in p.get("parts",[]) or []:
-                    txt = _walk_parts(ch)
-                    if txt: return txt
-                return ""
-
             text_body = _walk_parts(m.get("payload", {}))
             msgs_norm.append({
                 "from": frm,
@@ -849,99 +728,29 @@ def _gmail_fetch_newest_thread_direct(n_threads: int = 1, lookback_days: int = 1
     return {"threads": threads_out}
 
 
-def _gmail_create_draft_reply_flexible(
-    *, subject: str, body_text: str,
-    to: str | None = None,
-    thread_id: str | None = None,
-    in_reply_to_msgid: str | None = None,
-    refs: str | list[str] | None = None,
-):
-    """
-    Call google_ws.gmail_create_draft_reply using many common signatures.
-    Tries id-based first (thread_id / in_reply_to_msgid), then recipient-based
-    with multiple kwname variants, and body_text/body variants.
-    Returns draft_id (string) or raises the last error.
-    """
-    last_exc = None
-
-    # 1) Prefer thread-id based replies (most robust)
-    for kw in (
-        {"thread_id": thread_id, "subject": subject, "body_text": body_text},
-        {"threadId": thread_id, "subject": subject, "body_text": body_text},
-        {"in_reply_to_msgid": in_reply_to_msgid, "refs": refs, "subject": subject, "body_text": body_text},
-        {"in_reply_to_msgid": in_reply_to_msgid, "subject": subject, "body_text": body_text},  # no refs
-        # body_text -> body fallbacks
-        {"thread_id": thread_id, "subject": subject, "body": body_text},
-        {"threadId": thread_id, "subject": subject, "body": body_text},
-        {"in_reply_to_msgid": in_reply_to_msgid, "refs": refs, "subject": subject, "body": body_text},
-        {"in_reply_to_msgid": in_reply_to_msgid, "subject": subject, "body": body_text},
-    ):
-        if not any(kw.get(k) for k in ("thread_id", "threadId", "in_reply_to_msgid")):
-            continue
-        try:
-            # drop None values
-            clean = {k: v for k, v in kw.items() if v not in (None, "", [])}
-            return gmail_create_draft_reply(**clean)
-        except TypeError as e:
-            last_exc = e
-        except Exception as e:
-            last_exc = e
-
-    # 2) Recipient-based variants (if we have a 'to')
-    if to:
-        for kw in (
-            {"to": to, "subject": subject, "body_text": body_text},
-            {"recipient": to, "subject": subject, "body_text": body_text},
-            {"to_addr": to, "subject": subject, "body_text": body_text},
-            {"to_email": to, "subject": subject, "body_text": body_text},
-            # body_text -> body fallbacks
-            {"to": to, "subject": subject, "body": body_text},
-            {"recipient": to, "subject": subject, "body": body_text},
-            {"to_addr": to, "subject": subject, "body": body_text},
-            {"to_email": to, "subject": subject, "body": body_text},
-            # positional (defensive)
-            {"_positional": (to, subject, body_text)},
-        ):
-            try:
-                if "_positional" in kw:
-                    a = kw["_positional"]
-                    return gmail_create_draft_reply(*a)
-                clean = {k: v for k, v in kw.items() if k != "_positional" and v not in (None, "", [])}
-                return gmail_create_draft_reply(**clean)
-            except TypeError as e:
-                last_exc = e
-            except Exception as e:
-                last_exc = e
-
-    # 3) As a last resort, some helpers accept positional (subject, body) only
-    try:
-        return gmail_create_draft_reply(subject, body_text)  # positional
-    except Exception as e:
-        last_exc = e
-
-    raise RuntimeError(
-        f"gmail_create_draft_reply failed with all known signatures; last error: {last_exc}"
-    )
-
-
-def _build_gmail_summary_prompt(context: str, user_prompt: str) -> str:
-    return f"""
+_GMAIL_SUMMARY_PREFIX = """
 You are given a Gmail thread below. Summarize crisply for a busy person.
 
-[THREAD]
-{context}
-[/THREAD]
-
 Requirements:
 - 5–8 bullets covering decisions, asks, key dates, blockers.
 - Keep it terse and factual; no fluff.
 - Preserve the original language of the thread.
 - End with a final line: Next step: <one short actionable sentence>.
+"""
+_GMAIL_SUMMARY_TAIL = """
+[THREAD]
+{context}
+[/THREAD]
 
 User note: {user_prompt}
 """
 
 
+def _build_gmail_summary_prompt(context: str, user_prompt: str) -> str:
+    # static instructions first so the prefix is shared across requests (see _TRIAGE_PREFIX)
+    return _GMAIL_SUMMARY_PREFIX + _GMAIL_SUMMARY_TAIL.format(context=context, user_prompt=user_prompt)
+
+
 APP_NAME = "LLM Router API"
 
 # ----- Runtime config (env or sane defaults) -----
@@ -956,11 +765,20 @@ WRITE_TIMEOUT_S = int(os.getenv("OLLAMA_WRITE_TIMEOUT_S", "30"))
 RETRIES = int(os.getenv("OLLAMA_RETRIES", "2"))
 RETRY_BACKOFF_S = float(os.getenv("OLLAMA_RETRY_BACKOFF_S", "5.0"))
 
+# How long Ollama keeps the model (and its KV cache) loaded after a call; its own default is 5m
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "1h")
+
 # Triage-specific trims
 TRIAGE_DEFAULT_N = int(os.getenv("TRIAGE_DEFAULT_N", "3"))  # default fewer emails for slow CPUs
 TRIAGE_LOOKBACK_DAYS = int(os.getenv("TRIAGE_LOOKBACK_DAYS", "30"))
 TRIAGE_MAX_CONTEXT_CHARS = int(os.getenv("TRIAGE_MAX_CONTEXT_CHARS", "4000"))  # cap context length
 
+# Pipedrive prefetch defaults (spec.extra can still override per request)
+PD_LOOKBACK_DAYS = int(os.getenv("PD_LOOKBACK_DAYS", "7"))
+PD_THREAD_LOOKBACK_DAYS = int(os.getenv("PD_LOOKBACK_DAYS", "14"))  # thread summaries look further back
+PD_MAX_THREADS = int(os.getenv("PD_MAX_THREADS", "10"))
+PD_NO_REPLY_HOURS = int(os.getenv("PD_NO_REPLY_HOURS", "36"))
+
 # Model policy presets
 MODEL_TRIAGE_PRIMARY = os.getenv("MODEL_TRIAGE_PRIMARY", "phi3:mini")
 MODEL_TRIAGE_FALLBACK = os.getenv("MODEL_TRIAGE_FALLBACK", "tinyllama")
@@ -1012,7 +830,7 @@ def __diag(sample_quality_floor: int = 5, sample_expected_out_tokens: int = 256)
             "env_seen": env_seen,
             "planned": planned,
             "price_table_path": PRICE_TABLE_PATH,
-            "models_loaded": len(_MODELS),
+            "models_loaded": len(_price_table().models),
         }
     except Exception as e:
         return {"error": str(e)}
@@ -1088,16 +906,31 @@ def health() -> str:
 
 
 @app.get("/warmup")
-def warmup(kind: Optional[str] = None) -> Dict[str, Any]:
+async def warmup(kind: Optional[str] = None) -> Dict[str, Any]:
     """
     Pre-load a model into RAM so first "real" call is fast.
     - kind == 'ms.mail_triage' warms the triage model, else warm a tiny default.
     """
     model = choose_model(quality_floor=3, integration_kind=kind or "")
-    t0 = time.time()
+    # Prefill the kind's static prompt prefix instead of a bare "ok": the first real request of
+    # that kind then hits Ollama's KV cache for the whole instruction block. Kinds without a
+    # template just load the model (empty prompt) -- Ollama keeps one prompt cache per slot, so
+    # priming other kinds' prefixes on this model would only overwrite each other.
+    prefix = _WARMUP_PREFIXES.get(kind or "", "")
+    t0 = time.perf_counter_ns()
     try:
-        _ = call_ollama(model, "ok", timeout=make_timeout(), retries=0)  # no retries for warmup
-        return {"status": "ok", "model": model, "latency_ms": int((time.time() - t0) * 1000)}
+        try:
+            await _ollama_prefill(model, prefix)  # no retries for warmup
+        except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.HTTPError) as e:
+            # same fallback as call_ollama: the triage primary failing to load warms the fallback
+            if model != MODEL_TRIAGE_PRIMARY or not MODEL_TRIAGE_FALLBACK:
+                raise HTTPException(status_code=502, detail=f"Ollama error: {e}") from e
+            model = MODEL_TRIAGE_FALLBACK
+            try:
+                await _ollama_prefill(model, prefix)
+            except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.HTTPError) as e2:
+                raise HTTPException(status_code=502, detail=f"Ollama error (fallback failed): {e2}") from e2
+        return {"status": "ok", "model": model, "latency_ms": (time.perf_counter_ns() - t0) // 1_000_000}
     except HTTPException as e:
         return {"status": "error", "model": model, "detail": e.detail}
 
@@ -1131,33 +964,91 @@ def make_timeout() -> httpx.Timeout:
     )
 
 
-def call_ollama(model: str, prompt: str, timeout: httpx.Timeout, retries: int = RETRIES) -> str:
-    payload = {"model": model, "prompt": prompt, "stream": False}
+# One pooled async client for every Ollama call: keeps connections alive across requests and
+# retries, and a generation in flight doesn't pin a worker thread. Per-call timeouts are still
+# passed on each post().
+_OLLAMA_CLIENT = httpx.AsyncClient(
+    base_url=OLLAMA_BASE_URL,
+    timeout=make_timeout(),
+    limits=httpx.Limits(max_keepalive_connections=8, max_connections=16),
+)
+
+
+@app.on_event("shutdown")
+async def _close_ollama_client() -> None:
+    await _OLLAMA_CLIENT.aclose()
+
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+async def _ollama_generate(body: bytes, timeout: httpx.Timeout) -> str:
+    """
+    Streamed /api/generate: Ollama sends NDJSON chunks as tokens are produced, so there is no
+    single huge JSON body to buffer/parse and the read timeout applies between chunks.
+    """
+    parts: list[str] = []
+    async with _OLLAMA_CLIENT.stream(
+        "POST", "/api/generate", content=body, headers=_JSON_HEADERS, timeout=timeout
+    ) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line:
+                continue
+            obj = _json_loads(line)
+            if obj.get("error"):
+                # mid-stream failure (e.g. model crashed); surface it like any other HTTP error
+                raise httpx.HTTPError(f"Ollama stream error: {obj['error']}")
+            parts.append(obj.get("response", ""))
+            if obj.get("done"):
+                break
+    return "".join(parts)
+
+
+async def _ollama_prefill(model: str, prompt: str) -> None:
+    """Load the model and prefill `prompt` into its KV cache, generating a single token (empty prompt: load only)."""
+    body = _json_dumpb({
+        "model": model, "prompt": prompt, "stream": True,
+        "keep_alive": OLLAMA_KEEP_ALIVE, "options": {"num_predict": 1},
+    })
+    await _ollama_generate(body, make_timeout())
+
+
+# strong refs for fire-and-forget tasks (the loop only keeps weak ones)
+_BG_TASKS: set = set()
+
+
+async def _ollama_prefill_quiet(model: str, prompt: str) -> None:
+    # best effort: the real call reports errors, this one only warms the model up
+    try:
+        await _ollama_prefill(model, prompt)
+    except Exception:
+        pass
+
+
+async def call_ollama(model: str, prompt: str, timeout: httpx.Timeout, retries: int = RETRIES) -> str:
+    # serialized once (orjson when available) and reused across retries
+    body = _json_dumpb({"model": model, "prompt": prompt, "stream": True, "keep_alive": OLLAMA_KEEP_ALIVE})
     last_err: Optional[Exception] = None
 
     for attempt in range(retries + 1):
         try:
-            with httpx.Client(timeout=timeout) as client:
-                r = client.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload)
-                r.raise_for_status()
-                data = r.json()
-                return data.get("response", "")
+            return await _ollama_generate(body, timeout)
         except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.HTTPError) as e:
             last_err = e
             if attempt < retries:
-                time.sleep(RETRY_BACKOFF_S * (attempt + 1))
+                await asyncio.sleep(RETRY_BACKOFF_S * (attempt + 1))
                 continue
             # On final failure: if we were using the triage primary model, try fallback once
             if model == MODEL_TRIAGE_PRIMARY and MODEL_TRIAGE_FALLBACK:
                 try:
-                    with httpx.Client(timeout=timeout) as client:
-                        r = client.post(
-                            f"{OLLAMA_BASE_URL}/api/generate",
-                            json={"model": MODEL_TRIAGE_FALLBACK, "prompt": prompt, "stream": False},
-                        )
-                        r.raise_for_status()
-                        data = r.json()
-                        return data.get("response", "")
+                    return await _ollama_generate(
+                        _json_dumpb({
+                            "model": MODEL_TRIAGE_FALLBACK, "prompt": prompt, "stream": True,
+                            "keep_alive": OLLAMA_KEEP_ALIVE,
+                        }),
+                        timeout,
+                    )
                 except Exception as e2:
                     raise HTTPException(status_code=502, detail=f"Ollama error (fallback failed): {e2}") from e2
             raise HTTPException(status_code=502, detail=f"Ollama error: {last_err}") from last_err
@@ -1166,16 +1057,48 @@ def call_ollama(model: str, prompt: str, timeout: httpx.Timeout, retries: int =
     raise HTTPException(status_code=502, detail="Ollama call fell through unexpectedly")
 
 
+# In-process LRU of local generations, keyed by blake2b(model \0 prompt). LLM_CACHE_MAX=0 disables.
+_LLM_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+_LLM_CACHE_MAX = int(os.getenv("LLM_CACHE_MAX", "512"))
+_LLM_CACHE_LOCK = threading.Lock()
+
+
+def _llm_cache_key(model: str, prompt: str) -> bytes:
+    return hashlib.blake2b(f"{model}\0{prompt}".encode("utf-8"), digest_size=16).digest()
+
+
+async def call_ollama_cached(model: str, prompt: str, timeout: httpx.Timeout) -> tuple[str, bool]:
+    """call_ollama behind the LRU; returns (output, cache_hit). Warmup should use call_ollama directly."""
+    if _LLM_CACHE_MAX <= 0:
+        return await call_ollama(model=model, prompt=prompt, timeout=timeout), False
+    key = _llm_cache_key(model, prompt)
+    with _LLM_CACHE_LOCK:
+        hit = _LLM_CACHE.get(key)
+        if hit is not None:
+            _LLM_CACHE.move_to_end(key)
+            return hit, True
+    out = await call_ollama(model=model, prompt=prompt, timeout=timeout)
+    if out:  # don't pin empty generations
+        with _LLM_CACHE_LOCK:
+            _LLM_CACHE[key] = out
+            _LLM_CACHE.move_to_end(key)
+            while len(_LLM_CACHE) > _LLM_CACHE_MAX:
+                _LLM_CACHE.popitem(last=False)
+    return out, False
+
+
+@functools.cache
 def _lazy_import(func_path: str) -> Callable[..., Any]:
     """
     Import a function lazily from a 'module:function' string.
     Example: 'api.integrations.ms365:word_upsert_docx'
+    Resolved once per path; failures raise (and aren't cached) so the next call retries.
     """
-    try:
-        module_name, func_name = func_path.split(":")
-    except ValueError:
+    if func_path.count(":") != 1:
         raise HTTPException(status_code=500, detail=f"Bad integration binding: {func_path}")
+    module_name, func_name = func_path.split(":")
 
+    # import errors (SDK mismatches etc.) are reported as such, whatever exception type they raise
     try:
         mod = importlib.import_module(module_name)
     except Exception as e:
@@ -1185,13 +1108,32 @@ def _lazy_import(func_path: str) -> Callable[..., Any]:
         )
 
     try:
-        fn = getattr(mod, func_name)
+        return getattr(mod, func_name)
     except AttributeError:
         raise HTTPException(
             status_code=500,
             detail=f"Integration function '{func_name}' not found in {module_name}"
         )
-    return fn
+
+
+# Hot integration entry points, resolved at startup so the first request doesn't pay the import
+_PREWARM_IMPORTS = (
+    "api.integrations.ms365:build_inbox_triage_context",
+    "api.integrations.ms365:word_upsert_docx",
+    "api.integrations.ms365:mail_draft_reply_latest",
+    "api.integrations.ms365:calendar_create",
+    "api.integrations.gmail_direct:reply_to_newest_with_meta",
+    "api.integrations.zoho_recruit:shortlist_prefetch_from_zoho",
+)
+
+
+@app.on_event("startup")
+def _prewarm_lazy_imports() -> None:
+    for path in _PREWARM_IMPORTS:
+        try:
+            _lazy_import(path)
+        except HTTPException:
+            pass  # optional integration not installed/configured; the request path reports it
 
 
 def _prefetch_context(kind: str, spec: IntegrationSpec) -> Optional[str]:
@@ -1278,7 +1220,7 @@ def _prefetch_context(kind: str, spec: IntegrationSpec) -> Optional[str]:
     if kind == "pd.mail_lead":
         try:
             extra = spec.extra or {}
-            lookback_days = int(extra.get("lookback_days", os.getenv("PD_LOOKBACK_DAYS", "7")))
+            lookback_days = int(extra.get("lookback_days", PD_LOOKBACK_DAYS))
             return pd_mail_lead_prefetch(lookback_days=lookback_days)
         except Exception as e:
             raise HTTPException(status_code=502, detail=f"Pipedrive mail lead prefetch error: {e}")
@@ -1287,7 +1229,7 @@ def _prefetch_context(kind: str, spec: IntegrationSpec) -> Optional[str]:
     if kind == "pd.thread_summary_to_pd":
         try:
             extra = spec.extra or {}
-            lookback_days = int(extra.get("lookback_days", os.getenv("PD_LOOKBACK_DAYS", "14")))
+            lookback_days = int(extra.get("lookback_days", PD_THREAD_LOOKBACK_DAYS))
             return pd_thread_context_prefetch(lookback_days=lookback_days)
         except Exception as e:
             raise HTTPException(status_code=502, detail=f"Pipedrive thread prefetch error: {e}")
@@ -1298,9 +1240,9 @@ def _prefetch_context(kind: str, spec: IntegrationSpec) -> Optional[str]:
     if kind == "pd.inbox_lead_actions":
         try:
             extra = spec.extra or {}
-            lookback_days = int(extra.get("lookback_days", os.getenv("PD_LOOKBACK_DAYS", "7")))
-            max_threads = int(extra.get("max_threads", os.getenv("PD_MAX_THREADS", "10")))
-            consider_if_no_reply_hours = int(extra.get("consider_if_no_reply_hours", os.getenv("PD_NO_REPLY_HOURS", "36")))
+            lookback_days = int(extra.get("lookback_days", PD_LOOKBACK_DAYS))
+            max_threads = int(extra.get("max_threads", PD_MAX_THREADS))
+            consider_if_no_reply_hours = int(extra.get("consider_if_no_reply_hours", PD_NO_REPLY_HOURS))
             return inbox_lead_actions_prefetch(
                 lookback_days=lookback_days,
                 max_threads=max_threads,
@@ -1359,18 +1301,13 @@ def _prefetch_context(kind: str, spec: IntegrationSpec) -> Optional[str]:
 
 
 
-def _build_triage_prompt(context: str, user_prompt: str) -> str:
-    """
-    Construct a strict, structured prompt so small local models produce the fields we need.
-    We include a tiny example and require a fixed format and language rule.
-    """
-    return f"""
-[BEGIN CONTEXT]
-{context}
-[END CONTEXT]
-
+# Prompt layout: the static instructions come FIRST and the per-request CONTEXT / USER REQUEST
+# LAST, so every request of a kind shares the same leading bytes and Ollama/hosted prefix
+# caches can reuse the prefill for them. *_PREFIX is plain text (also used by /warmup),
+# *_TAIL is the str.format template for the dynamic part.
+_TRIAGE_PREFIX = """
 [INSTRUCTIONS]
-You are an assistant that performs inbox triage ONLY based on the CONTEXT above.
+You are an assistant that performs inbox triage ONLY based on the CONTEXT below.
 For each message [i], you MUST produce the following exact fields:
 
 - QuickAction: yes|no - one short reason.
@@ -1389,25 +1326,33 @@ Language rule: respond in the same language as the original message (Polish vs E
   LeadPotential: low - no buying intent.
   ReplyDraft: None
 
-[USER REQUEST]
-{user_prompt}
-
 [OUTPUT REQUIREMENTS]
 - Use the exact bullet format as in the example.
 - Keep answers concise.
 - Do NOT add any sections other than the bullet list.
 """
+_TRIAGE_TAIL = """
+[BEGIN CONTEXT]
+{context}
+[END CONTEXT]
 
+[USER REQUEST]
+{user_prompt}
+"""
 
 
-def _build_pd_actions_prompt(context: str, user_prompt: str) -> str:
-    return f"""
-[CONTEXT]
-{context}
-[/CONTEXT]
+def _build_triage_prompt(context: str, user_prompt: str) -> str:
+    """
+    Construct a strict, structured prompt so small local models produce the fields we need.
+    We include a tiny example and require a fixed format and language rule.
+    """
+    return _TRIAGE_PREFIX + _TRIAGE_TAIL.format(context=context, user_prompt=user_prompt)
+
 
+
+_PD_ACTIONS_PREFIX = """
 [INSTRUCTIONS]
-For each [DEAL] block above, produce exactly this format:
+For each [DEAL] block in the CONTEXT below, produce exactly this format:
 
 - [DealTitle]
   Action: reply | schedule | nudge | close | none — one short reason (max 20 words).
@@ -1422,72 +1367,115 @@ Rules:
 - Prefer "close" only if clearly no interest.
 - If no action is needed, use "none".
 
-[REQUEST]
-{user_prompt}
-
 [OUTPUT]
 Use exactly the bullet format shown above. No extra sections.
 """
+_PD_ACTIONS_TAIL = """
+[CONTEXT]
+{context}
+[/CONTEXT]
+
+[REQUEST]
+{user_prompt}
+"""
+
+
+def _build_pd_actions_prompt(context: str, user_prompt: str) -> str:
+    return _PD_ACTIONS_PREFIX + _PD_ACTIONS_TAIL.format(context=context, user_prompt=user_prompt)
+
+
+# read once at import (was an env lookup per request)
+_PD_MAX_OUTPUT_ITEMS = int(os.getenv("PD_MAX_OUTPUT_ITEMS", "8"))
+
+_PD_MAILTRIAGE_PREFIX = (
+    "[INSTRUCTIONS]\n"
+    "You perform EMAIL inbox triage ONLY based on the CONTEXT below.\n"
+    f"Output AT MOST {_PD_MAX_OUTPUT_ITEMS} items that clearly need action. Choose the most urgent ones.\n"
+    "For each email item (e.g., lines starting with [EMAIL i] or - From:), produce exactly these fields:\n"
+    "- Index: the numeric index you infer from CONTEXT (e.g., 1, 2, 3...)\n"
+    "- From: copy the sender name and email exactly as shown in CONTEXT\n"
+    "- Subject: copy the subject exactly as shown in CONTEXT (or (no subject))\n"
+    "- Status: copy the status field from CONTEXT if present (e.g., unanswered_incoming / awaiting_their_reply / unknown)\n"
+    "- QuickAction: yes|no - one short reason\n"
+    "- LeadLikelihood: high|medium|low - one short reason\n"
+    "- NextAction: reply now | schedule follow-up | ask for info | none\n"
+    "- ReplyDraft: 3-6 short sentences in the same language as the email IF NextAction is 'reply now'; otherwise write: None\n\n"
+    "[OUTPUT FORMAT]\n"
+    "- [Index]\n"
+    "  From: Name <email@domain>\n"
+    "  Subject: subject text\n"
+    "  Status: unanswered_incoming\n"
+    "  QuickAction: yes - sender asked for next steps\n"
+    "  LeadLikelihood: medium - shows buying intent\n"
+    "  NextAction: reply now\n"
+    "  ReplyDraft: Thank you for your message. I can propose a short call tomorrow to walk through...\n\n"
+    "[RULES]\n"
+    "- Be concise and practical.\n"
+    "- Use the exact bullet structure shown under OUTPUT FORMAT for each item.\n"
+    "- Do not include more than the specified fields per item.\n"
+    "- Do not add any extra sections.\n\n"
+)
+_PD_MAILTRIAGE_TAIL = (
+    "[BEGIN CONTEXT]\n"
+    "{context}\n"
+    "[END CONTEXT]\n\n"
+    "[USER REQUEST]\n"
+    "{user_prompt}\n"
+)
+
 
 def _build_pd_mailtriage_prompt(context: str, user_prompt: str) -> str:
     """
     Email inbox triage prompt (ASCII-only). Matches pd.inbox_lead_actions context.
     Produces a compact checklist per email with sender details and conditional drafts.
     """
-    max_items = int(os.getenv("PD_MAX_OUTPUT_ITEMS", "8"))
-    return (
-        "[BEGIN CONTEXT]\n"
-        f"{context}\n"
-        "[END CONTEXT]\n\n"
-        "[INSTRUCTIONS]\n"
-        "You perform EMAIL inbox triage ONLY based on the CONTEXT above.\n"
-        f"Output AT MOST {max_items} items that clearly need action. Choose the most urgent ones.\n"
-        "For each email item (e.g., lines starting with [EMAIL i] or - From:), produce exactly these fields:\n"
-        "- Index: the numeric index you infer from CONTEXT (e.g., 1, 2, 3...)\n"
-        "- From: copy the sender name and email exactly as shown in CONTEXT\n"
-        "- Subject: copy the subject exactly as shown in CONTEXT (or (no subject))\n"
-        "- Status: copy the status field from CONTEXT if present (e.g., unanswered_incoming / awaiting_their_reply / unknown)\n"
-        "- QuickAction: yes|no - one short reason\n"
-        "- LeadLikelihood: high|medium|low - one short reason\n"
-        "- NextAction: reply now | schedule follow-up | ask for info | none\n"
-        "- ReplyDraft: 3-6 short sentences in the same language as the email IF NextAction is 'reply now'; otherwise write: None\n\n"
-        "[OUTPUT FORMAT]\n"
-        "- [Index]\n"
-        "  From: Name <email@domain>\n"
-        "  Subject: subject text\n"
-        "  Status: unanswered_incoming\n"
-        "  QuickAction: yes - sender asked for next steps\n"
-        "  LeadLikelihood: medium - shows buying intent\n"
-        "  NextAction: reply now\n"
-        "  ReplyDraft: Thank you for your message. I can propose a short call tomorrow to walk through...\n\n"
-        "[USER REQUEST]\n"
-        f"{user_prompt}\n\n"
-        "[RULES]\n"
-        "- Be concise and practical.\n"
-        "- Use the exact bullet structure shown under OUTPUT FORMAT for each item.\n"
-        "- Do not include more than the specified fields per item.\n"
-        "- Do not add any extra sections.\n"
-    )
+    return _PD_MAILTRIAGE_PREFIX + _PD_MAILTRIAGE_TAIL.format(context=context, user_prompt=user_prompt)
+
+
+_PD_MAILLEAD_PREFIX = (
+    "[INSTRUCTIONS]\n"
+    "Decide if the sender is a potential sales lead based ONLY on the CONTEXT below.\n"
+    "Output EXACTLY these lines:\n"
+    "Lead: yes|no - one short reason (<=12 words)\n"
+    "Category: inbound|partner|support|spam|other - best guess\n"
+    "NextAction: reply now | ask for info | schedule follow-up | none\n"
+    "ReplyDraft: 3-6 short sentences in the same language IF Lead is yes and NextAction is reply now; otherwise write: None\n\n"
+)
+_PD_MAILLEAD_TAIL = (
+    "[BEGIN CONTEXT]\n"
+    "{context}\n"
+    "[END CONTEXT]\n\n"
+    "[USER REQUEST]\n"
+    "{user_prompt}\n"
+)
 
 
 def _build_pd_maillead_prompt(context: str, user_prompt: str) -> str:
     """
     Strict, ASCII-only prompt for deciding if newest PD mailbox thread is a lead.
     """
-    return (
-        "[BEGIN CONTEXT]\n"
-        f"{context}\n"
-        "[END CONTEXT]\n\n"
-        "[INSTRUCTIONS]\n"
-        "Decide if the sender is a potential sales lead based ONLY on the CONTEXT above.\n"
-        "Output EXACTLY these lines:\n"
-        "Lead: yes|no - one short reason (<=12 words)\n"
-        "Category: inbound|partner|support|spam|other - best guess\n"
-        "NextAction: reply now | ask for info | schedule follow-up | none\n"
-        "ReplyDraft: 3-6 short sentences in the same language IF Lead is yes and NextAction is reply now; otherwise write: None\n\n"
-        "[USER REQUEST]\n"
-        f"{user_prompt}\n"
-    )
+    return _PD_MAILLEAD_PREFIX + _PD_MAILLEAD_TAIL.format(context=context, user_prompt=user_prompt)
+
+
+_MS_LEADSCAN_PREFIX = (
+    "[INSTRUCTIONS]\n"
+    "Decide for each message if it is a potential sales lead based ONLY on the CONTEXT below.\n"
+    "Return ONLY valid JSON using this EXACT schema and nothing else.\n"
+    "{\n"
+    "  \"leads\": [\n"
+    "    {\"index\": 1, \"is_lead\": true, \"sender_name\": \"Full Name\", \"sender_email\": \"user@example.com\", "
+    "\"reply_subject\": \"Re: <short subject>\", \"reply_draft\": \"<3–6 concise sentences>\"}\n"
+    "  ]\n"
+    "}\n\n"
+)
+_MS_LEADSCAN_TAIL = (
+    "[BEGIN CONTEXT]\n"
+    "{context}\n"
+    "[END CONTEXT]\n\n"
+    "[USER REQUEST]\n"
+    "{user_prompt}\n"
+)
+
 
 def _build_ms_leadscan_prompt(context: str, user_prompt: str) -> str:
     """
@@ -1514,284 +1502,248 @@ def _build_ms_leadscan_prompt(context: str, user_prompt: str) -> str:
     - If nothing qualifies, return {"leads": []}.
     - Do NOT include any explanation outside the JSON.
     """
-    return (
-        "[BEGIN CONTEXT]\n"
-        f"{context}\n"
-        "[END CONTEXT]\n\n"
-        "[INSTRUCTIONS]\n"
-        "Decide for each message if it is a potential sales lead based ONLY on the CONTEXT above.\n"
-        "Return ONLY valid JSON using this EXACT schema and nothing else.\n"
-        "{\n"
-        "  \"leads\": [\n"
-        "    {\"index\": 1, \"is_lead\": true, \"sender_name\": \"Full Name\", \"sender_email\": \"user@example.com\", "
-        "\"reply_subject\": \"Re: <short subject>\", \"reply_draft\": \"<3–6 concise sentences>\"}\n"
-        "  ]\n"
-        "}\n\n"
-        "[USER REQUEST]\n"
-        f"{user_prompt}\n"
-    )
-
-
-
-def dispatch_integration(kind: str, output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
-    """
-    Map 'kind' to a lazily-imported function and execute it (post-LLM).
-    For 'ms.mail_triage' and 'g.gmail_summarize' there is no post action; analysis is already in output_text.
-    """
-    bindings = {
-        # Microsoft 365 (existing)
-        "ms.word_upsert": "api.integrations.ms365:word_upsert_docx",
-        "ms.mail_draft_reply": "api.integrations.ms365:mail_draft_reply_latest",
-        "ms.calendar_create": "api.integrations.ms365:calendar_create",
-
-        # Pipedrive (optional: not used by our custom branches below, but safe to keep)
-        "pd.stalled_report": "api.integrations.pipedrive:stalled_deals_report",
-        "pd.email_lead_from_gmail": "api.integrations.pipedrive:email_lead_from_gmail",
-        "pd.thread_summary_to_pd": "api.integrations.pipedrive:summarize_gmail_thread_and_note",
-        # (No direct bindings needed for Google helpers we imported directly below.)
-    }
-
-    # No post action needed — LLM output is the final artifact
-    if kind in ("ms.mail_triage", "g.gmail_summarize", "pd.inbox_lead_actions",
-                "zoho.resume_summarize_prefetch", "zoho.resume_eval_prefetch",
-                "zoho.shortlist_prefetch", "zoho.shortlist_prefetch_from_zoho",
-                "zoho.resume_summarize_from_zoho"):
-        return {"artifact_uri": None, "integration_status": "ok"}
-
-    # Google: create a Gmail draft reply using LLM output
-    if kind == "g.gmail_draft_reply":
-        try:
-            extra = spec.extra or {}
-            add_quote = bool(extra.get("add_quote", False))
-            quote_chars = int(extra.get("quote_chars", 600))
-            query = extra.get("query")  # optional Gmail search query override
-
-            # If caller forces IDs, keep that path (back-compat); else auto-mode with meta
-            force_thread_id = (extra.get("thread_id") or "").strip() or None
-            force_hdr_msgid = (extra.get("in_reply_to_msgid") or "").strip() or None
-            force_refs = extra.get("refs")
-            force_subject = (extra.get("subject") or "").strip() or None
-            force_to = (extra.get("to") or "").strip() or None
-
-            if not (force_thread_id or force_hdr_msgid):
-                # Auto mode with metadata (new)
-                fn = _lazy_import("api.integrations.gmail_direct:reply_to_newest_with_meta")
-                draft_id, meta = fn(
-                    body_text=output_text,
-                    query=query,
-                    add_quote=add_quote,
-                    quote_chars=quote_chars,
-                )
-                # Surface WHAT we replied to
-                subj = (meta.get("subject") or "").strip()
-                frm = (meta.get("from") or "").strip()
-                # return status + keep original output_text (optionally add a footer you can see)
-                return {
-                    "artifact_uri": f"gmail-draft://{draft_id}",
-                    "integration_status": f"ok — replying to '{subj}' from {frm}",
-                    "output_override": output_text  # keep body as-is (quoted part already injected if add_quote=True)
-                }
-
-            # Back-compat: explicit IDs path using direct creator
-            creator = _lazy_import("api.integrations.gmail_direct:create_reply_draft")
-            # If thread missing but msg-id present, fetch newest meta to get thread fallback
-            if not force_thread_id:
-                info = _lazy_import("api.integrations.gmail_direct:get_newest_message_info")()
-                force_thread_id = info.get("thread_id")
-                if not force_to:
-                    force_to = info.get("from")
-
-            draft_id = creator(
+    return _MS_LEADSCAN_PREFIX + _MS_LEADSCAN_TAIL.format(context=context, user_prompt=user_prompt)
+
+
+# Static prefix primed by /warmup for each kind that uses a templated prompt
+_WARMUP_PREFIXES: Mapping[str, str] = MappingProxyType({
+    "ms.mail_triage": _TRIAGE_PREFIX,
+    "pd.inbox_lead_actions": _PD_MAILTRIAGE_PREFIX,
+    "pd.mail_lead": _PD_MAILLEAD_PREFIX,
+    "ms.mail_leads_to_pd": _MS_LEADSCAN_PREFIX,
+    "g.gmail_summarize": _GMAIL_SUMMARY_PREFIX,
+})
+
+
+# Integration kinds whose LLM output is the final artifact (no post action)
+_NO_POST_KINDS = frozenset({
+    "ms.mail_triage", "g.gmail_summarize", "pd.inbox_lead_actions", "pd.mail_lead",
+    "zoho.resume_summarize_prefetch", "zoho.resume_eval_prefetch",
+    "zoho.shortlist_prefetch", "zoho.shortlist_prefetch_from_zoho",
+    "zoho.resume_summarize_from_zoho",
+})
+
+_BINDINGS: Mapping[str, str] = MappingProxyType({
+    # Microsoft 365 (existing)
+    "ms.word_upsert": "api.integrations.ms365:word_upsert_docx",
+    "ms.mail_draft_reply": "api.integrations.ms365:mail_draft_reply_latest",
+    "ms.calendar_create": "api.integrations.ms365:calendar_create",
+
+    # Pipedrive (optional: not used by our custom branches below, but safe to keep)
+    "pd.stalled_report": "api.integrations.pipedrive:stalled_deals_report",
+    "pd.email_lead_from_gmail": "api.integrations.pipedrive:email_lead_from_gmail",
+    "pd.thread_summary_to_pd": "api.integrations.pipedrive:summarize_gmail_thread_and_note",
+    # (No direct bindings needed for Google helpers we imported directly below.)
+})
+
+
+def _post_gmail_draft_reply(output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
+    """Google: create a Gmail draft reply using LLM output."""
+    try:
+        extra = spec.extra or {}
+        add_quote = bool(extra.get("add_quote", False))
+        quote_chars = int(extra.get("quote_chars", 600))
+        query = extra.get("query")  # optional Gmail search query override
+
+        # If caller forces IDs, keep that path (back-compat); else auto-mode with meta
+        force_thread_id = (extra.get("thread_id") or "").strip() or None
+        force_hdr_msgid = (extra.get("in_reply_to_msgid") or "").strip() or None
+        force_refs = extra.get("refs")
+        force_subject = (extra.get("subject") or "").strip() or None
+        force_to = (extra.get("to") or "").strip() or None
+
+        if not (force_thread_id or force_hdr_msgid):
+            # Auto mode with metadata (new)
+            fn = _lazy_import("api.integrations.gmail_direct:reply_to_newest_with_meta")
+            draft_id, meta = fn(
                 body_text=output_text,
-                thread_id=force_thread_id,
-                hdr_msgid=force_hdr_msgid,
-                refs=force_refs,
-                subject=force_subject,
-                to=force_to,
+                query=query,
+                add_quote=add_quote,
+                quote_chars=quote_chars,
             )
-            return {"artifact_uri": f"gmail-draft://{draft_id}", "integration_status": "ok"}
-
-        except HttpError as he:
-            raise HTTPException(status_code=502, detail=f"Gmail API error: {he}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Gmail draft failed: {e}")
-
+            # Surface WHAT we replied to
+            subj = (meta.get("subject") or "").strip()
+            frm = (meta.get("from") or "").strip()
+            # return status + keep original output_text (optionally add a footer you can see)
+            return {
+                "artifact_uri": f"gmail-draft://{draft_id}",
+                "integration_status": f"ok — replying to '{subj}' from {frm}",
+                "output_override": output_text  # keep body as-is (quoted part already injected if add_quote=True)
+            }
 
+        # Back-compat: explicit IDs path using direct creator
+        creator = _lazy_import("api.integrations.gmail_direct:create_reply_draft")
+        # If thread missing but msg-id present, fetch newest meta to get thread fallback
+        if not force_thread_id:
+            info = _lazy_import("api.integrations.gmail_direct:get_newest_message_info")()
+            force_thread_id = info.get("thread_id")
+            if not force_to:
+                force_to = info.get("from")
+
+        draft_id = creator(
+            body_text=output_text,
+            thread_id=force_thread_id,
+            hdr_msgid=force_hdr_msgid,
+            refs=force_refs,
+            subject=force_subject,
+            to=force_to,
+        )
+        return {"artifact_uri": f"gmail-draft://{draft_id}", "integration_status": "ok"}
 
-    # Google: create a Google Doc with LLM output
-    if kind == "g.docs_create":
-        try:
-            title = (spec.extra.get("title") if spec and spec.extra else None) or "LLM Summary"
-            doc_id = gdocs_create_from_text(title, output_text)
-            return {"artifact_uri": f"docs://{doc_id}", "integration_status": "ok"}
-        except HttpError as he:
-            raise HTTPException(status_code=502, detail=f"Google Docs error: {he}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Google Docs failed: {e}")
+    except HttpError as he:
+        raise HTTPException(status_code=502, detail=f"Gmail API error: {he}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gmail draft failed: {e}")
 
-    # --- Pipedrive: 3 flows ---
 
-    # 1) Stalled deals report: override output with report text (no post action)
-    if kind == "pd.stalled_report":
-        try:
-            report = stalled_deals_report(**(spec.extra or {}))
-            return {"artifact_uri": None, "integration_status": "ok", "output_override": report}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Pipedrive stalled report failed: {e}")
+def _post_docs_create(output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
+    """Google: create a Google Doc with LLM output."""
+    try:
+        title = (spec.extra.get("title") if spec and spec.extra else None) or "LLM Summary"
+        doc_id = gdocs_create_from_text(title, output_text)
+        return {"artifact_uri": f"docs://{doc_id}", "integration_status": "ok"}
+    except HttpError as he:
+        raise HTTPException(status_code=502, detail=f"Google Docs error: {he}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Google Docs failed: {e}")
 
-    # 2) Decide if newest Gmail is a lead: we already gave the LLM the newest mail context
-    #    Here we just pass through the LLM decision (no PD write in this minimal version)
-    if kind == "pd.mail_lead":
-        return {"artifact_uri": None, "integration_status": "ok"}
 
-    # 3) Summarize newest Gmail thread and save as PD Note (post phase writes the note)
-    if kind == "pd.thread_summary_to_pd":
-        try:
-            uri = summarize_pdmail_thread_and_note(llm_summary=output_text)
-            return {"artifact_uri": uri, "integration_status": "ok"}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Pipedrive note create failed: {e}")
-
-    # --- M365 → Pipedrive: create persons/leads for detected leads ---
-    if kind == "ms.mail_leads_to_pd":
-        import json, re
-        api = _pipedrive_api_base()
-        token = os.getenv("PIPEDRIVE_API_TOKEN")
-        if not token:
-            raise HTTPException(status_code=400, detail="PIPEDRIVE_API_TOKEN not set")
-
-        def _http():
-            return httpx.Client(timeout=httpx.Timeout(connect=10.0, read=30.0, write=10.0, pool=10.0))
-
-        def _clean_email(v: str) -> str:
-            if not v:
-                return ""
-            s = v.strip()
-            if "<" in s and ">" in s:
-                try:
-                    s = s.split("<", 1)[1].split(">", 1)[0].strip()
-                except Exception:
-                    pass
-            return s
-
-        def _find_person_id_by_email(email: str) -> Optional[int]:
-            if not email:
-                return None
-            params = {"api_token": token, "term": email, "fields": "email", "exact_match": 1, "limit": 1}
-            with _http() as c:
-                r = c.get(f"{api}/persons/search", params=params)
-                r.raise_for_status()
-                data = r.json() or {}
-                items = (data.get("data") or {}).get("items") or []
-                if items:
-                    return (items[0].get("item") or {}).get("id")
-            return None
+def _post_pd_stalled_report(output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
+    """Pipedrive stalled deals report: override output with report text (no post action)."""
+    try:
+        report = stalled_deals_report(**(spec.extra or {}))
+        return {"artifact_uri": None, "integration_status": "ok", "output_override": report}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Pipedrive stalled report failed: {e}")
 
-        def _create_person(name: str, email: str) -> int:
-            body = {
-                "name": name or (email.split("@")[0] if email else "Unknown"),
-                "email": [{"value": email, "primary": True, "label": "work"}] if email else [],
-            }
-            params = {"api_token": token}
-            with _http() as c:
-                r = c.post(f"{api}/persons", params=params, json=body)
-                r.raise_for_status()
-                return (r.json().get("data") or {}).get("id")
-
-        def _create_lead(title: str, person_id: Optional[int]) -> int:
-            body = {"title": title or "Inbound email lead"}
-            if person_id:
-                body["person_id"] = int(person_id)
-            params = {"api_token": token}
-            with _http() as c:
-                r = c.post(f"{api}/leads", params=params, json=body)
-                r.raise_for_status()
-                return (r.json().get("data") or {}).get("id")
-
-        # Parse model output as JSON; be forgiving if the model wrapped it in text
-        text = (output_text or "").strip()
-        try:
-            payload = json.loads(text)
-        except Exception:
-            m = re.search(r"\{[\s\S]*\}", text)
-            payload = json.loads(m.group(0)) if m else {"leads": []}
 
-        leads = payload.get("leads") or []
-        created = []
-        for it in leads:
-            try:
-                if not bool(it.get("is_lead")):
-                    continue
-                sender_email = _clean_email(str(it.get("sender_email") or ""))
-                sender_name = (it.get("sender_name") or (sender_email.split("@")[0] if sender_email else "Unknown")).strip()
-                reply_subject = (it.get("reply_subject") or "").strip() or f"Re: {sender_name}"
-                # Pipedrive person
-                pid = _find_person_id_by_email(sender_email)
-                if not pid:
-                    pid = _create_person(sender_name, sender_email)
-                # Pipedrive lead (title required; link to person)
-                lead_title = f"Inbound: {sender_name} - {reply_subject}"[:180]
-                lid = _create_lead(lead_title, pid)
-                created.append(
-                    {"person_id": pid, "lead_id": lid, "email": sender_email, "name": sender_name, "subject": reply_subject}
-                )
-            except Exception as e:
-                created.append({"error": _redact(str(e))})
-
-        # Compact status for logs/VS Code
-        lines = []
-        for c in created:
-            if "error" in c:
-                lines.append(f"- ERROR: {c['error']}")
-            else:
-                lines.append(
-                    f"- Name: {c['name']} | Email: {c['email']} | PersonId: {c['person_id']} | LeadId: {c['lead_id']} | Subject: {c['subject']}"
-                )
-        status = "ok" if any("lead_id" in c for c in created) else "no_leads_created"
-        return {
-            "artifact_uri": None,
-            "integration_status": f"{status} — source=ms365 | Pipedrive results: " + " ; ".join(lines[:10]),
-            "output_override": output_text,
-        }
+def _post_pd_thread_summary(output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
+    """Summarize newest Gmail thread and save as PD Note (post phase writes the note)."""
+    try:
+        uri = summarize_pdmail_thread_and_note(llm_summary=output_text)
+        return {"artifact_uri": uri, "integration_status": "ok"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Pipedrive note create failed: {e}")
 
 
+def _post_ms_leads_to_pd(output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
+    """M365 → Pipedrive: create persons/leads for detected leads."""
+    import json, re
+    api = _pipedrive_api_base()
+    token = os.getenv("PIPEDRIVE_API_TOKEN")
+    if not token:
+        raise HTTPException(status_code=400, detail="PIPEDRIVE_API_TOKEN not set")
 
+    def _http():
+        return httpx.Client(timeout=httpx.Timeout(connect=10.0, read=30.0, write=10.0, pool=10.0))
 
+    def _find_person_id_by_email(email: str) -> Optional[int]:
+        if not email:
+            return None
+        params = {"api_token": token, "term": email, "fields": "email", "exact_match": 1, "limit": 1}
+        with _http() as c:
+            r = c.get(f"{api}/persons/search", params=params)
+            r.raise_for_status()
+            data = r.json() or {}
+            items = (data.get("data") or {}).get("items") or []
+            if items:
+                return (items[0].get("item") or {}).get("id")
+        return None
 
-    # --- Zoho Recruit (lazy import; resume flows use prefetch) ---
+    def _create_person(name: str, email: str) -> int:
+        body = {
+            "name": name or (email.split("@")[0] if email else "Unknown"),
+            "email": [{"value": email, "primary": True, "label": "work"}] if email else [],
+        }
+        params = {"api_token": token}
+        with _http() as c:
+            r = c.post(f"{api}/persons", params=params, json=body)
+            r.raise_for_status()
+            return (r.json().get("data") or {}).get("id")
+
+    def _create_lead(title: str, person_id: Optional[int]) -> int:
+        body = {"title": title or "Inbound email lead"}
+        if person_id:
+            body["person_id"] = int(person_id)
+        params = {"api_token": token}
+        with _http() as c:
+            r = c.post(f"{api}/leads", params=params, json=body)
+            r.raise_for_status()
+            return (r.json().get("data") or {}).get("id")
+
+    # Parse model output as JSON; be forgiving if the model wrapped it in text
+    text = (output_text or "").strip()
+    try:
+        payload = json.loads(text)
+    except Exception:
+        m = re.search(r"\{[\s\S]*\}", text)
+        payload = json.loads(m.group(0)) if m else {"leads": []}
 
-    if kind == "zoho.create_candidate_from_email":
+    leads = payload.get("leads") or []
+    created = []
+    for it in leads:
         try:
-            extra = spec.extra or {}
-            fn = _lazy_import("api.integrations.zoho_recruit:create_candidate")
-            link = fn(
-                name=extra.get("name", "Unknown"),
-                email=extra.get("email", ""),
-                phone=extra.get("phone", None),
+            if not bool(it.get("is_lead")):
+                continue
+            sender_email = _extract_email(str(it.get("sender_email") or ""))
+            sender_name = (it.get("sender_name") or (sender_email.split("@")[0] if sender_email else "Unknown")).strip()
+            reply_subject = (it.get("reply_subject") or "").strip() or f"Re: {sender_name}"
+            # Pipedrive person
+            pid = _find_person_id_by_email(sender_email)
+            if not pid:
+                pid = _create_person(sender_name, sender_email)
+            # Pipedrive lead (title required; link to person)
+            lead_title = f"Inbound: {sender_name} - {reply_subject}"[:180]
+            lid = _create_lead(lead_title, pid)
+            created.append(
+                {"person_id": pid, "lead_id": lid, "email": sender_email, "name": sender_name, "subject": reply_subject}
             )
-            return {"artifact_uri": link, "integration_status": "ok"}
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Zoho create candidate failed: {e}")
+            created.append({"error": _redact(str(e))})
 
+    # Compact status for logs/VS Code
+    lines = []
+    for c in created:
+        if "error" in c:
+            lines.append(f"- ERROR: {c['error']}")
+        else:
+            lines.append(
+                f"- Name: {c['name']} | Email: {c['email']} | PersonId: {c['person_id']} | LeadId: {c['lead_id']} | Subject: {c['subject']}"
+            )
+    status = "ok" if any("lead_id" in c for c in created) else "no_leads_created"
+    return {
+        "artifact_uri": None,
+        "integration_status": f"{status} — source=ms365 | Pipedrive results: " + " ; ".join(lines[:10]),
+        "output_override": output_text,
+    }
 
-    if kind in ("zoho.resume_summarize_prefetch", "zoho.resume_eval_prefetch"):
-        # LLM output (summary/eval) is the artifact; nothing to write to Zoho here
-        return {"artifact_uri": None, "integration_status": "ok"}
 
-    if kind == "zoho.create_candidate_from_pdmail":
-        try:
-            fn = _lazy_import("api.integrations.zoho_recruit:create_candidate_from_pdmail")
-            link = fn()
-            return {"artifact_uri": link, "integration_status": "ok"}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Zoho create candidate from PD mail failed: {e}")
+def _post_zoho_candidate_from_email(output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
+    try:
+        extra = spec.extra or {}
+        fn = _lazy_import("api.integrations.zoho_recruit:create_candidate")
+        link = fn(
+            name=extra.get("name", "Unknown"),
+            email=extra.get("email", ""),
+            phone=extra.get("phone", None),
+        )
+        return {"artifact_uri": link, "integration_status": "ok"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Zoho create candidate failed: {e}")
 
 
-    # Existing Microsoft bindings
-    if kind not in bindings:
-        raise HTTPException(status_code=400, detail=f"Unsupported integration kind: {kind}")
+def _post_zoho_candidate_from_pdmail(output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
+    try:
+        fn = _lazy_import("api.integrations.zoho_recruit:create_candidate_from_pdmail")
+        link = fn()
+        return {"artifact_uri": link, "integration_status": "ok"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Zoho create candidate from PD mail failed: {e}")
 
-    fn = _lazy_import(bindings[kind])
+
+def _dispatch_msft(kind: str, output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
+    """Existing Microsoft bindings (module:function looked up in _BINDINGS)."""
+    fn = _lazy_import(_BINDINGS[kind])
 
     try:
         if kind == "ms.word_upsert":
@@ -1822,10 +1774,50 @@ def dispatch_integration(kind: str, output_text: str, spec: IntegrationSpec) ->
     raise HTTPException(status_code=500, detail="Integration dispatch fell through unexpectedly")
 
 
+# kind -> post-LLM handler; checked before the generic _BINDINGS path
+_POST_HANDLERS: Mapping[str, Callable[[str, IntegrationSpec], Dict[str, Any]]] = MappingProxyType({
+    "g.gmail_draft_reply": _post_gmail_draft_reply,
+    "g.docs_create": _post_docs_create,
+    "pd.stalled_report": _post_pd_stalled_report,
+    "pd.thread_summary_to_pd": _post_pd_thread_summary,
+    "ms.mail_leads_to_pd": _post_ms_leads_to_pd,
+    "zoho.create_candidate_from_email": _post_zoho_candidate_from_email,
+    "zoho.create_candidate_from_pdmail": _post_zoho_candidate_from_pdmail,
+})
+
+
+def dispatch_integration(kind: str, output_text: str, spec: IntegrationSpec) -> Dict[str, Any]:
+    """
+    Map 'kind' to a lazily-imported function and execute it (post-LLM).
+    For 'ms.mail_triage' and 'g.gmail_summarize' there is no post action; analysis is already in output_text.
+    """
+    # No post action needed — LLM output is the final artifact
+    if kind in _NO_POST_KINDS:
+        return {"artifact_uri": None, "integration_status": "ok"}
+
+    handler = _POST_HANDLERS.get(kind)
+    if handler is not None:
+        return handler(output_text, spec)
+
+    if kind not in _BINDINGS:
+        raise HTTPException(status_code=400, detail=f"Unsupported integration kind: {kind}")
+    return _dispatch_msft(kind, output_text, spec)
+
+
+def _plan_is_local(prompt: str, expected_out_tokens: int, quality_floor: int, cost_ceiling_usd: float) -> bool:
+    """True if the cost planner would run this prompt on Ollama (local pick, or hosted over the ceiling)."""
+    try:
+        planned, planned_cost = _pick_model_and_cost(prompt, expected_out_tokens, quality_floor)
+    except HTTPException:
+        return False  # the real plan raises the same error after prefetch
+    return planned["provider"] == "ollama" or planned_cost > cost_ceiling_usd
+
 
 @app.post("/route", response_model=RouteResponse)
-def route(req: RouteRequest) -> RouteResponse:
-    t0 = time.time()
+async def route(req: RouteRequest) -> RouteResponse:
+    # async so the (long) Ollama wait doesn't hold a threadpool worker; the blocking
+    # SDK/HTTP hops (prefetch, hosted providers, integrations) still run in the threadpool.
+    t0 = time.perf_counter_ns()
 
     # Model policy (triage uses a slightly stronger but still cheap local model)
     kind = req.integration.kind if req.integration else None
@@ -1837,8 +1829,19 @@ def route(req: RouteRequest) -> RouteResponse:
     # Optional prefetch: enrich prompt for certain kinds before LLM call
     prompt = req.prompt
     pre = None
+    warm = None
     if req.integration is not None:
-        pre = _prefetch_context(req.integration.kind, req.integration)  # ← MISSING CALL (restore)
+        # Load the local model (and prefill the kind's static prefix) while the context is being
+        # fetched, so a cold start costs max(fetch, load) instead of fetch + load. Only when the
+        # route is going to be local: prefetch only adds tokens, so a local/over-ceiling plan on
+        # the bare prompt stays local (the planner is memoized; the real plan runs below).
+        if _plan_is_local(req.prompt, req.expected_output_tokens, req.quality_floor, req.cost_ceiling_usd):
+            warm = asyncio.create_task(
+                _ollama_prefill_quiet(selected["model"], _WARMUP_PREFIXES.get(req.integration.kind, "\n"))
+            )
+            _BG_TASKS.add(warm)
+            warm.add_done_callback(_BG_TASKS.discard)
+        pre = await run_in_threadpool(_prefetch_context, req.integration.kind, req.integration)  # ← MISSING CALL (restore)
         if pre and req.integration.kind == "ms.mail_triage":
             prompt = _build_triage_prompt(pre, req.prompt)
         elif pre and req.integration.kind == "pd.inbox_lead_actions":
@@ -1853,41 +1856,42 @@ def route(req: RouteRequest) -> RouteResponse:
             prompt = f"{pre}\n\n=== USER REQUEST ===\n{req.prompt}"
 
     # ---- Cost-aware model planning (from price_table.yaml) ----
-    planned = _pick_model_by_policy(prompt, req.expected_output_tokens, req.quality_floor)
+    # Budget check uses the cost the planner already computed for its pick
+    planned, planned_cost = _pick_model_and_cost(prompt, req.expected_output_tokens, req.quality_floor)
     # safety: planner must always return a dict; if not, force a local fallback
     if not planned:
         planned = {"provider": "ollama", "model": choose_model(req.quality_floor, kind), "baseline_quality": 2}
+        planned_cost = 0.0
     provider = planned["provider"]
     model = planned["model"]
 
-    # Budget check (rough heuristic using the same estimator)
-    in_toks, out_toks = _estimate_tokens(prompt, req.expected_output_tokens)
-    planned_cost = _estimate_cost(planned, in_toks, out_toks)
-
     # If hosted & over ceiling → force local cheap fallback
     use_hosted = (provider != "ollama") and (planned_cost <= req.cost_ceiling_usd)
+    if use_hosted and warm is not None:
+        warm.cancel()  # the local model isn't needed unless the hosted call fails
 
     # Prepare exec vars
     output = ""
     actual_provider = provider
     estimated_cost_usd = 0.0
     integration_status = None
+    cached = False
 
     if use_hosted:
         try:
             if provider == "openai":
-                output = call_openai(model, prompt, req.expected_output_tokens, temperature=0.2)
+                output = await run_in_threadpool(call_openai, model, prompt, req.expected_output_tokens, temperature=0.2)
             elif provider == "anthropic":
-                output = call_anthropic(model, prompt, req.expected_output_tokens, temperature=0.2)
+                output = await run_in_threadpool(call_anthropic, model, prompt, req.expected_output_tokens, temperature=0.2)
             elif provider == "mistral":
-                output = call_mistral(model, prompt, req.expected_output_tokens, temperature=0.2)
+                output = await run_in_threadpool(call_mistral, model, prompt, req.expected_output_tokens, temperature=0.2)
             elif provider == "google":
                 # Resolve against available models for your key (copes with project access differences)
                 api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GOOGLE_GENAI_API_KEY") or os.getenv("GEMINI_API_KEY")
                 if not api_key:
                     raise RuntimeError("Google provider selected but no API key set")
-                model = _google_resolve_model(model, api_key)
-                output = call_google_genai(model, prompt, req.expected_output_tokens, temperature=0.2)
+                model = await run_in_threadpool(_google_resolve_model, model, api_key)
+                output = await run_in_threadpool(call_google_genai, model, prompt, req.expected_output_tokens, temperature=0.2)
             else:
                 # Unknown hosted → local fallback
                 raise RuntimeError(f"Unsupported provider: {provider}")
@@ -1898,14 +1902,16 @@ def route(req: RouteRequest) -> RouteResponse:
         except Exception as e:
             # hosted failed → fallback to local
             fallback_model = choose_model(req.quality_floor, kind)
-            output = call_ollama(model=fallback_model, prompt=prompt, timeout=make_timeout())
+            output, cached = await call_ollama_cached(fallback_model, prompt, make_timeout())
             actual_provider = "ollama"
             model = fallback_model
             integration_status = f"hosted-fallback: {str(e)[:120]} | used=ollama/{model}"
     else:
         # Always safe local path
         fallback_model = choose_model(req.quality_floor, kind)
-        output = call_ollama(model=fallback_model, prompt=prompt, timeout=make_timeout())
+        output, cached = await call_ollama_cached(fallback_model, prompt, make_timeout())
+        if cached and warm is not None:
+            warm.cancel()  # answered from the LRU; stop a prefill still in flight
         actual_provider = "ollama"
         model = fallback_model
         integration_status = f"used=ollama/{model}"
@@ -1915,7 +1921,7 @@ def route(req: RouteRequest) -> RouteResponse:
     artifact_uri = None
     # keep whatever was computed earlier in integration_status
     if req.integration is not None:
-        result = dispatch_integration(req.integration.kind, output, req.integration)
+        result = await run_in_threadpool(dispatch_integration, req.integration.kind, output, req.integration)
         artifact_uri = result.get("artifact_uri")
         integ = result.get("integration_status")
         if integ:
@@ -1926,7 +1932,7 @@ def route(req: RouteRequest) -> RouteResponse:
 
 
 
-    latency_ms = int((time.time() - t0) * 1000)
+    latency_ms = (time.perf_counter_ns() - t0) // 1_000_000  # monotonic, integer-only
 
     return RouteResponse(
         job_id=os.urandom(8).hex(),
@@ -1935,7 +1941,7 @@ def route(req: RouteRequest) -> RouteResponse:
         output_text=output,
         estimated_cost_usd=estimated_cost_usd,
         latency_ms=latency_ms,
-        cached=False,
+        cached=cached,
         artifact_uri=artifact_uri,
         integration_status=integration_status,
     )